@@ -0,0 +1,26 @@
+# Configuración para ejecutar varios workers compartiendo memoria:
+#
+#   gunicorn -c gunicorn.conf.py main:app
+#
+# Con preload_app la aplicación (modelo spaCy, ejemplos de intención,
+# clasificador e índice de películas) se carga una sola vez en el proceso
+# maestro antes del fork, y los workers comparten esas páginas
+# copy-on-write. `uvicorn --workers N` no sirve para esto porque arranca
+# los workers con spawn y cada uno vuelve a cargar todo.
+#
+# Para compartir también las cachés entre workers, usar CACHE_BACKEND=archivo.
+# SYNC_ENABLED=true haría que cada worker mantenga su propia copia de las
+# tablas y sondee Backendless; por eso viene desactivada.
+import gc
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+
+def when_ready(server):
+    # Mueve los objetos ya cargados a la generación permanente del GC para
+    # que las recolecciones en los workers no toquen (y copien) esas páginas.
+    gc.freeze()
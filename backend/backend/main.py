@@ -1,11 +1,35 @@
 from fastapi import Body, FastAPI, Query
 from fastapi import HTTPException
-from pydantic import BaseModel
-from services.backendless_client import backendless_get, backendless_patch
-from services.recommendations import create_recommendation, get_similar_movies, get_trending_movies
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from services.backendless_client import CAMPOS_PELICULA, backendless_get, backendless_patch
+from services.recommendations import (
+    create_recommendation,
+    iter_create_recommendation,
+    iter_similar_movies,
+    iter_trending_movies,
+    resultado_final,
+    reuso_stats,
+)
 from services.intentions import detect_intention_spacy
+from services.text_normalization import normalize_many, normalize_text_uncached
+from services.sync import SYNC_ENABLED, sincronizador
+from services.cache import cache
+from services.rate_limiter import tmdb_limiter
+from services.ratings import rating_aggregates, rebuild_from_backendless
+from services.resilience import GATEWAY_DEADLINE, Deadline, DeadlineExceeded, UpstreamUnavailable, deadline, metrics
+
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional
+    orjson = None
 
-import unicodedata
+# Respuestas mayores a este tamaño (bytes) se comprimen con gzip; 0 lo desactiva
+GZIP_MIN_BYTES = int(os.getenv("GZIP_MIN_BYTES", "1024"))
 
 app = FastAPI(title="Movie Recommender API", version="0.1")
 
@@ -19,13 +43,86 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if GZIP_MIN_BYTES > 0:
+    app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_BYTES)
+
+
+def _dumps(content) -> bytes:
+    """Serializa a JSON con orjson si está disponible."""
+    if orjson is None:
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse que serializa con orjson cuando está instalado.
+    Los endpoints de listas la devuelven directamente para evitar
+    también el paso por jsonable_encoder.
+    """
+    def render(self, content) -> bytes:
+        return _dumps(content)
+
 # ====== MODELO DE ENTRADA DE CONSULTA ======
 class RecomendacionRequest(BaseModel):
     consulta: str
+    tipo_busqueda: str | None = "texto"  # "texto" | "keyword"
 
 class GatewayIn(BaseModel):
     utterance: str
     tipo_busqueda: str | None = "texto"  # "texto" | "keyword"
+    max_results: int = Field(5, ge=1, le=100)
+
+
+@app.exception_handler(UpstreamUnavailable)
+def upstream_no_disponible(request, exc: UpstreamUnavailable):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+
+@app.exception_handler(DeadlineExceeded)
+def plazo_agotado(request, exc: DeadlineExceeded):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+
+@app.on_event("startup")
+def iniciar_sincronizacion():
+    if SYNC_ENABLED:
+        sincronizador.start()
+
+
+@app.on_event("shutdown")
+def detener_sincronizacion():
+    sincronizador.stop()
+
+
+def _listar_detalles():
+    """
+    Devuelve los detalles de recomendación desde la copia local sincronizada;
+    si aún no está lista, los consulta directamente en Backendless.
+    """
+    tabla = sincronizador.table("detalleRecomendaciones")
+    if tabla:
+        return tabla.rows()
+    return backendless_get("detalleRecomendaciones")
+
+
+def _obtener_pelicula(pelicula_id: str):
+    """Obtiene una película de la copia local o, si no está, de Backendless."""
+    tabla = sincronizador.table("peliculas")
+    pelicula = tabla.get(pelicula_id) if tabla else None
+    if pelicula is None:
+        pelicula = backendless_get(f"peliculas/{pelicula_id}", props=CAMPOS_PELICULA)
+    return pelicula
+
+
+def _resumen_pelicula(pelicula_id: str | None):
+    """Devuelve solo los campos expuestos de la película, o None."""
+    if not pelicula_id:
+        return None
+    pelicula = _obtener_pelicula(pelicula_id)
+    if isinstance(pelicula, dict) and pelicula.get("objectId"):
+        return {campo: pelicula.get(campo) for campo in CAMPOS_PELICULA}
+    return None
 
 
 @app.get("/")
@@ -40,12 +137,13 @@ def recomendar(payload: RecomendacionRequest = Body(...)):
     El campo usuario_id es opcional.
     """
     result = create_recommendation(
-        consulta=payload.consulta
+        consulta=payload.consulta,
+        tipo_busqueda=payload.tipo_busqueda or "texto"
     )
     return result
 
 
-@app.get("/recomendacion")
+@app.get("/recomendacion", response_class=FastJSONResponse)
 def listar_recomendaciones(q: str = Query(None, description="Texto a buscar en razón de recomendación")):
     """
     Devuelve todas las recomendaciones cuyo campo razon_recomendacion contiene el texto indicado.
@@ -53,59 +151,30 @@ def listar_recomendaciones(q: str = Query(None, description="Texto a buscar en r
     No distingue mayúsculas ni acentos.
     """
     # Normalizamos el texto para eliminar acentos y pasar a minúsculas
-    if q:
-        q_normalizado = (
-            unicodedata.normalize("NFD", q)
-            .encode("ascii", "ignore")
-            .decode("utf-8")
-            .lower()
-        )
-    else:
-        q_normalizado = ""
+    q_normalizado = normalize_text_uncached(q)
 
     # Obtenemos todos los registros de detalleRecomendaciones
-    detalles = backendless_get("detalleRecomendaciones")
+    detalles = _listar_detalles()
 
     if not isinstance(detalles, list):
-        return {"mensaje": "Error en la consulta", "detalles": []}
+        return FastJSONResponse({"mensaje": "Error en la consulta", "detalles": []})
 
-    resultados = []
-    for item in detalles:
-        razon = item.get("razon_recomendacion", "")
-        razon_normalizada = (
-            unicodedata.normalize("NFD", razon)
-            .encode("ascii", "ignore")
-            .decode("utf-8")
-            .lower()
-        )
+    # Se normalizan todas las razones en una sola pasada
+    razones = normalize_many([item.get("razon_recomendacion", "") for item in detalles])
 
+    resultados = []
+    for item, razon_normalizada in zip(detalles, razones):
         # Filtrado de coincidencia
         if q_normalizado in razon_normalizada:
-            pelicula_id = item.get("peliculaId")
-            pelicula = None
-
-            # Si hay película asociada, obtenerla desde Backendless
-            if pelicula_id:
-                pelicula = backendless_get(f"peliculas/{pelicula_id}")
-                if isinstance(pelicula, dict) and pelicula.get("objectId"):
-                    # Reducir solo a los campos que queremos exponer
-                    pelicula = {
-                        "objectId": pelicula.get("objectId"),
-                        "titulo": pelicula.get("titulo"),
-                        "mdb_id": pelicula.get("mdb_id"),
-                        "sinopsis": pelicula.get("sinopsis"),
-                        "fecha_estreno": pelicula.get("fecha_estreno"),
-                    }
-
-            # Agregar al resultado final
+            # Si hay película asociada, obtener solo los campos que exponemos
             item_con_pelicula = item.copy()
-            item_con_pelicula["pelicula"] = pelicula
+            item_con_pelicula["pelicula"] = _resumen_pelicula(item.get("peliculaId"))
             resultados.append(item_con_pelicula)
 
-    return {
+    return FastJSONResponse({
         "mensaje": f"Se encontraron {len(resultados)} resultados que coinciden con '{q}'",
         "detalles": resultados
-    }
+    })
 
 
 @app.get("/intention")
@@ -118,15 +187,7 @@ def chat_endpoint(q: str = Query(None, description="Texto a buscar en razón de
     """
 
     # Normalizamos el texto para eliminar acentos y pasar a minúsculas
-    if q:
-        q_normalizado = (
-            unicodedata.normalize("NFD", q)
-            .encode("ascii", "ignore")
-            .decode("utf-8")
-            .lower()
-        )
-    else:
-        q_normalizado = ""
+    q_normalizado = normalize_text_uncached(q)
 
     analisis = detect_intention_spacy(q_normalizado)
     intencion = analisis["intencion"]
@@ -168,61 +229,194 @@ def actualizar_evaluacion(detalle_id: str, evaluacion: int = Query(..., ge=0, le
     Actualiza la evaluación de un detalle de recomendación.
     """
     payload = {"evaluacion": evaluacion}
-    backendless_patch("detalleRecomendaciones", detalle_id, payload)
+    detalle = backendless_patch("detalleRecomendaciones", detalle_id, payload)
+    _registrar_evaluacion(detalle_id, detalle, evaluacion)
     return {"mensaje": f"Evaluación registrada ({evaluacion} estrellas)."}
 
 
+def _registrar_evaluacion(detalle_id: str, detalle: dict, evaluacion: int):
+    """
+    Actualiza los agregados de evaluaciones (por película y por consulta).
+    Si falla, la evaluación ya quedó guardada en Backendless y los
+    agregados se corrigen con POST /stats/reconstruir.
+    """
+    try:
+        pelicula_id = detalle.get("peliculaId")
+        pelicula = _obtener_pelicula(pelicula_id) if pelicula_id else None
+        consulta = None
+        if detalle.get("recomendacionId"):
+            recomendacion = backendless_get(f"recomendaciones/{detalle['recomendacionId']}", props=["consulta"])
+            consulta = recomendacion.get("consulta")
+        rating_aggregates.record(
+            detalle_id,
+            pelicula_id,
+            evaluacion,
+            consulta=consulta,
+            mdb_id=pelicula.get("mdb_id") if pelicula else None,
+            titulo=pelicula.get("titulo") if pelicula else None,
+        )
+    except Exception as e:
+        print(f"No se pudieron actualizar los agregados de {detalle_id}: {e}")
+
+
+@app.get("/stats")
+def estadisticas(
+    pelicula_id: str = Query(None, description="objectId de la película"),
+    consulta: str = Query(None, description="Consulta (sin distinguir acentos ni mayúsculas)"),
+    limite: int = Query(10, ge=1, le=100),
+    min_evaluaciones: int = Query(1, ge=1),
+):
+    """
+    Promedios de evaluación por película y por consulta, leídos de los
+    agregados (sin recorrer detalleRecomendaciones).
+    """
+    return {
+        "peliculas": rating_aggregates.movie_stats(pelicula_id, limite, min_evaluaciones),
+        "consultas": rating_aggregates.query_stats(consulta, limite),
+    }
+
+
+@app.post("/stats/reconstruir")
+def reconstruir_estadisticas():
+    """
+    Recalcula todos los agregados de evaluaciones desde Backendless.
+    """
+    return {"evaluaciones": rebuild_from_backendless(rating_aggregates)}
+
+
+@app.get("/sync")
+def estado_sincronizacion():
+    """
+    Estado de la copia local: filas, marca (high-water mark) y lag en segundos.
+    """
+    return sincronizador.status()
+
+
+@app.post("/sync/resincronizar")
+def resincronizar():
+    """
+    Fuerza una resincronización completa de las tablas locales.
+    """
+    return {"filas": sincronizador.resync(), "estado": sincronizador.status()}
+
+
+@app.get("/metrics")
+def metricas():
+    """
+    Estado de los circuit breakers por upstream, estadísticas de hedging,
+    espera en la cola del limitador de TMDB, aciertos de la caché y
+    tasa de reutilización de recomendaciones.
+    """
+    total = reuso_stats["reutilizadas"] + reuso_stats["nuevas"]
+    reuso = {**reuso_stats, "tasa": round(reuso_stats["reutilizadas"] / total, 3) if total else 0.0}
+    return {
+        **metrics(),
+        "tmdb_limiter": tmdb_limiter.status(),
+        "cache": cache.status(),
+        "reuso_recomendaciones": reuso,
+    }
+
+
 @app.post("/gateway")
 def gateway(payload: GatewayIn):
     """
     Recibe texto del usuario, detecta intención y ejecuta la acción
     (crear recomendación, listar o calificar). Si no soportada, 422.
+    Todas las llamadas salientes comparten un plazo de GATEWAY_DEADLINE segundos.
     """
-    # 1) Normalizar texto y detectar intención
-    texto = (
-        unicodedata.normalize("NFD", payload.utterance)
-        .encode("ascii", "ignore")
-        .decode("utf-8")
-        .lower()
+    with deadline(GATEWAY_DEADLINE):
+        return FastJSONResponse(resultado_final(_iter_gateway(payload)))
+
+
+@app.post("/gateway/stream")
+def gateway_stream(payload: GatewayIn):
+    """
+    Igual que /gateway, pero responde con server-sent events:
+      - "intencion": intención detectada y consulta
+      - "detalle": cada película/detalle en cuanto se resuelve
+      - "resumen": la respuesta completa (la misma de /gateway)
+      - "error": {"status", "detail"} si la operación falla
+    """
+    eventos = _sse_gateway(payload, Deadline(GATEWAY_DEADLINE))
+    return StreamingResponse(
+        eventos,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
+
+
+def _sse(evento: str, datos) -> bytes:
+    return f"event: {evento}\ndata: ".encode("utf-8") + _dumps(datos) + b"\n\n"
+
+
+def _sse_gateway(payload: GatewayIn, plazo: Deadline):
+    """
+    Traduce los eventos de _iter_gateway a SSE. Cada paso corre con el
+    plazo activo (StreamingResponse avanza el generador en distintos hilos).
+    """
+    eventos = _iter_gateway(payload)
+    while True:
+        try:
+            with plazo.activate():
+                evento, datos = next(eventos)
+        except StopIteration:
+            return
+        except HTTPException as e:
+            evento, datos = "error", {"status": e.status_code, "detail": e.detail}
+        except UpstreamUnavailable as e:
+            evento, datos = "error", {"status": 503, "detail": str(e)}
+        except DeadlineExceeded as e:
+            evento, datos = "error", {"status": 504, "detail": str(e)}
+        except Exception as e:
+            print(f"Error en /gateway/stream: {e}")
+            evento, datos = "error", {"status": 500, "detail": str(e)}
+
+        yield _sse(evento, datos)
+        if evento == "error":
+            return
+
+
+def _iter_gateway(payload: GatewayIn):
+    """
+    Detecta la intención y ejecuta la acción, generando eventos
+    (evento, datos). El último evento es siempre "resumen".
+    """
+    # 1) Normalizar texto y detectar intención
+    texto = normalize_text_uncached(payload.utterance)
     analisis = detect_intention_spacy(texto)
     intent = (analisis.get("intencion") or "").strip()
     consulta = (analisis.get("consulta") or "").strip()
     print(f"\nAnálisis: {analisis}\n")
 
+    yield "intencion", {"intencion": intent, "consulta": consulta}
+
     # 2) Enrutar por intención
     # ------------------------------------------------------------
     if intent == "nueva_recomendacion":
-        return create_recommendation(consulta=consulta)
+        yield from iter_create_recommendation(
+            consulta=consulta,
+            tipo_busqueda=payload.tipo_busqueda or "texto",
+            max_results=payload.max_results,
+        )
+        return
 
     # ------------------------------------------------------------
     if intent == "ver_recomendaciones":
-        detalles = backendless_get("detalleRecomendaciones")
+        detalles = _listar_detalles()
         if not isinstance(detalles, list):
             raise HTTPException(status_code=500, detail="Error al consultar detalleRecomendaciones")
 
         resultados = []
         for item in detalles:
-            pelicula_id = item.get("peliculaId")
-            pelicula = None
-            if pelicula_id:
-                peli = backendless_get(f"peliculas/{pelicula_id}")
-                if isinstance(peli, dict) and peli.get("objectId"):
-                    pelicula = {
-                        "objectId": peli.get("objectId"),
-                        "titulo": peli.get("titulo"),
-                        "mdb_id": peli.get("mdb_id"),
-                        "sinopsis": peli.get("sinopsis"),
-                        "fecha_estreno": peli.get("fecha_estreno"),
-                    }
             item_out = item.copy()
-            item_out["pelicula"] = pelicula
+            item_out["pelicula"] = _resumen_pelicula(item.get("peliculaId"))
             resultados.append(item_out)
 
-        return {
+        yield "resumen", {
             "mensaje": f"Se encontraron {len(resultados)} resultados",
             "detalles": resultados
         }
+        return
 
     # ------------------------------------------------------------
     if intent == "calificar_recomendaciones":
@@ -233,30 +427,31 @@ def gateway(payload: GatewayIn):
         detalles = backendless_get("detalleRecomendaciones", params)
 
         if not detalles:
-            return {"mensaje": "No hay recomendaciones pendientes por evaluar."}
+            yield "resumen", {"mensaje": "No hay recomendaciones pendientes por evaluar."}
+            return
 
         detalle = detalles[0]
         pelicula = backendless_get("peliculas", {"where": f"objectId='{detalle['peliculaId']}'"})
         if pelicula and isinstance(pelicula, list):
             detalle["pelicula"] = pelicula[0]
 
-        return {
+        yield "resumen", {
             "mensaje": "Evaluación pendiente",
             "detalle": detalle
         }
+        return
 
     # ------------------------------------------------------------
     if intent == "buscar_similares":
-        return get_similar_movies(consulta)
+        yield from iter_similar_movies(consulta, payload.max_results)
+        return
 
     # ------------------------------------------------------------
     if intent == "ver_tendencias":
         # Puedes decidir el tipo dinámicamente si el usuario menciona "estreno"
         tipo = "estrenos" if "estreno" in payload.utterance.lower() else "popular"
-        return get_trending_movies(tipo)
-
+        yield from iter_trending_movies(tipo, payload.max_results)
+        return
 
     # ------------------------------------------------------------
     raise HTTPException(status_code=422, detail=f"Operación no soportada: {intent}")
-
-
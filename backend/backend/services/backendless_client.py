@@ -1,7 +1,9 @@
 import os
-import requests
 from dotenv import load_dotenv
 
+from .cache import cache
+from .resilience import upstream_request
+
 load_dotenv()
 
 BASE_URL = "https://api.backendless.com"
@@ -10,51 +12,76 @@ REST_API_KEY = os.getenv("BACKENDLESS_REST_API_KEY")
 
 HEADERS = {"Content-Type": "application/json; charset=utf-8"}
 
+# Columnas de peliculas que se exponen a los clientes
+CAMPOS_PELICULA = ("objectId", "titulo", "mdb_id", "sinopsis", "fecha_estreno")
+
+# Tablas cuyas filas no se modifican después de creadas (salvo num_resultados
+# y mensaje_resultado de una recomendación que quedó incompleta, que no se
+# leen por id); sus lecturas por id se guardan en la caché compartida
+# durante BACKENDLESS_CACHE_TTL segundos.
+TABLAS_CACHEABLES = {"peliculas", "recomendaciones"}
+BACKENDLESS_CACHE_TTL = float(os.getenv("BACKENDLESS_CACHE_TTL", "3600"))
+
 
 def get_full_url(path: str) -> str:
     return f"{BASE_URL}/{APP_ID}/{REST_API_KEY}/{path}"
 
 
 def backendless_post(table: str, payload: dict):
-    r = requests.post(get_full_url(f"data/{table}"), json=payload, headers=HEADERS)
+    r = upstream_request("backendless", "POST", get_full_url(f"data/{table}"), json=payload, headers=HEADERS)
     r.raise_for_status()
     return r.json()
 
 
-def backendless_get(table: str, where: str | dict | None = None):
+def backendless_get(table: str, where: str | dict | None = None, props: list[str] | tuple | None = None):
     """
     Realiza una consulta GET a Backendless.
     Puede recibir:
       - una cadena 'where' (por ejemplo: "campo='valor'")
       - un diccionario con parámetros (por ejemplo: {"where": "campo='valor'", "sortBy": "fecha desc"})
       - una ruta directa (por ejemplo: "peliculas/1234-5678")
+    'props' limita las columnas devueltas (por ejemplo: ["objectId", "titulo"]).
     """
+    proyeccion = {"props": ",".join(props)} if props else {}
+
     # Si el nombre contiene '/', asumimos que es una ruta directa (GET /data/{tabla}/{id})
+    # Es una lectura idempotente, así que admite hedging si tarda.
     if "/" in table:
+        cacheable = table.split("/", 1)[0] in TABLAS_CACHEABLES
+        clave = f"backendless:{table}?{proyeccion.get('props', '')}"
+        if cacheable:
+            fila = cache.get(clave)
+            if fila is not None:
+                return fila
+
         url = get_full_url(f"data/{table}")
-        r = requests.get(url, headers=HEADERS)
+        r = upstream_request("backendless", "GET", url, hedge=True, params=proyeccion, headers=HEADERS)
         r.raise_for_status()
-        return r.json()
+        fila = r.json()
+        if cacheable:
+            cache.set(clave, fila, BACKENDLESS_CACHE_TTL)
+        return fila
 
     # Si 'where' es cadena -> la convertimos en params dict
     if isinstance(where, str):
         params = {"where": where}
     # Si 'where' ya es un dict (puede incluir sortBy, pageSize, etc.)
     elif isinstance(where, dict):
-        params = where
+        params = dict(where)
     else:
         params = {}
+    params.update(proyeccion)
 
     # Hacer la llamada con query params
     url = get_full_url(f"data/{table}")
-    r = requests.get(url, params=params, headers=HEADERS)
+    r = upstream_request("backendless", "GET", url, params=params, headers=HEADERS)
     r.raise_for_status()
     return r.json()
 
 
 def backendless_patch(table: str, object_id: str, payload: dict):
     url = get_full_url(f"data/{table}/{object_id}")
-    r = requests.put(url, json=payload, headers=HEADERS)
+    r = upstream_request("backendless", "PUT", url, json=payload, headers=HEADERS)
     r.raise_for_status()
     return r.json()
 
@@ -0,0 +1,72 @@
+import random
+import time
+
+from .text_normalization import normalize_many, normalize_text, normalize_text_reference, normalize_text_uncached
+
+# =====================================================
+# ====== Microbenchmark de normalización de texto =====
+# =====================================================
+# Compara el costo por fila de la normalización original con la tabla
+# Latin-1 (en lote, suelta y sin caché) sobre 100k razones de recomendación
+# distintas, y aparte el costo de un acierto en la caché de normalize_text.
+# Uso: python -m services.bench_normalization
+
+FILAS = 100_000
+DISTINTAS_CACHE = 2_000
+TERMINOS = [
+    "Acción", "Comedia romántica", "Ciencia ficción", "Animación", "Películas de época",
+    "Suspenso psicológico", "Viajes en el tiempo", "Música", "Niños", "Fantasía épica",
+]
+PLANTILLAS = [
+    "Coincide con '{}'",
+    "Porque te gustó '{}'",
+    "Similar a tu búsqueda: {}",
+    "Recomendación según tu intención: {} — TENDENCIA",
+]
+
+
+def generar_razones(n: int, distintas: int) -> list[str]:
+    """n razones elegidas de un conjunto de 'distintas' cadenas diferentes."""
+    rng = random.Random(0)
+    conjunto = [
+        rng.choice(PLANTILLAS).format(rng.choice(TERMINOS)) + f" #{i}"
+        for i in range(distintas)
+    ]
+    return [conjunto[i % distintas] for i in range(n)]
+
+
+def medir(nombre: str, filas: int, funcion, unidad: str = "fila"):
+    inicio = time.perf_counter()
+    resultado = funcion()
+    segundos = time.perf_counter() - inicio
+    print(f"{nombre:<42} {segundos * 1000:8.1f} ms  {segundos / filas * 1e9:7.0f} ns/{unidad}")
+    return resultado
+
+
+def main():
+    # Todas distintas: la caché no interviene
+    razones = generar_razones(FILAS, FILAS)
+    referencia = medir("referencia (NFD por fila)", FILAS, lambda: [normalize_text_reference(r) for r in razones])
+    lote = medir("normalize_many (lote)", FILAS, lambda: normalize_many(razones))
+    normalize_text.cache_clear()
+    sueltas = medir("normalize_text (sin aciertos)", FILAS, lambda: [normalize_text(r) for r in razones])
+    sin_cache = medir("normalize_text_uncached", FILAS, lambda: [normalize_text_uncached(r) for r in razones])
+    assert lote == referencia
+    assert sin_cache == referencia
+    assert sueltas == referencia
+
+    # Cadenas repetidas: mide solo aciertos, con la caché ya poblada
+    repetidas = generar_razones(FILAS, DISTINTAS_CACHE)
+    normalize_text.cache_clear()
+    for r in set(repetidas):
+        normalize_text(r)
+    memo = medir(
+        f"normalize_text ({DISTINTAS_CACHE} distintas, en caché)", FILAS,
+        lambda: [normalize_text(r) for r in repetidas], unidad="acierto",
+    )
+    assert memo == [normalize_text_reference(r) for r in repetidas]
+    print(f"caché: {normalize_text.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
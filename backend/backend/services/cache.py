@@ -0,0 +1,169 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# =====================================================
+# ============ Caché compartida entre workers ==========
+# =====================================================
+# L1: diccionario LRU con TTL dentro de cada proceso.
+# L2 (opcional): archivo SQLite en modo WAL, compartido por todos los
+# workers de la misma máquina. Se selecciona con CACHE_BACKEND:
+#   - "memoria": solo L1 (por proceso)
+#   - "archivo": L1 delante de L2 en CACHE_PATH
+# Los valores deben ser serializables a JSON.
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memoria")
+CACHE_PATH = os.getenv(
+    "CACHE_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "data", "cache.sqlite3"),
+)
+CACHE_L1_MAX = int(os.getenv("CACHE_L1_MAX", "2048"))
+# Con L2, cuánto puede vivir una copia en L1 (acota lo desactualizado entre workers)
+CACHE_L1_TTL = float(os.getenv("CACHE_L1_TTL", "30"))
+# Cada cuántas escrituras en L2 (por proceso) se borran las entradas vencidas
+CACHE_PURGE_CADA = int(os.getenv("CACHE_PURGE_CADA", "500"))
+
+
+class MemoryCache:
+    def __init__(self, max_items: int = CACHE_L1_MAX):
+        self.max_items = max_items
+        self.datos = OrderedDict()  # clave -> (expira, valor)
+        self.lock = threading.Lock()
+
+    def get(self, clave: str):
+        with self.lock:
+            item = self.datos.get(clave)
+            if item is None:
+                return None
+            if item[0] < time.time():
+                del self.datos[clave]
+                return None
+            self.datos.move_to_end(clave)
+            return item[1]
+
+    def set(self, clave: str, valor, ttl: float):
+        with self.lock:
+            self.datos[clave] = (time.time() + ttl, valor)
+            self.datos.move_to_end(clave)
+            while len(self.datos) > self.max_items:
+                self.datos.popitem(last=False)
+
+    def delete(self, clave: str):
+        with self.lock:
+            self.datos.pop(clave, None)
+
+
+class FileCache:
+    def __init__(self, path: str = CACHE_PATH, purgar_cada: int = CACHE_PURGE_CADA):
+        self.path = path
+        self.local = threading.local()
+        self.purgar_cada = purgar_cada
+        self.escrituras = 0
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def _conexion(self) -> sqlite3.Connection:
+        # Una conexión por hilo y por proceso (no se heredan tras un fork)
+        con = getattr(self.local, "con", None)
+        if con is None or self.local.pid != os.getpid():
+            con = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS cache (clave TEXT PRIMARY KEY, valor TEXT NOT NULL, expira REAL NOT NULL)"
+            )
+            self.local.con = con
+            self.local.pid = os.getpid()
+        return con
+
+    def get(self, clave: str):
+        fila = self._conexion().execute(
+            "SELECT valor FROM cache WHERE clave = ? AND expira > ?", (clave, time.time())
+        ).fetchone()
+        return json.loads(fila[0]) if fila else None
+
+    def set(self, clave: str, valor, ttl: float):
+        self._conexion().execute(
+            "INSERT OR REPLACE INTO cache (clave, valor, expira) VALUES (?, ?, ?)",
+            (clave, json.dumps(valor, ensure_ascii=False), time.time() + ttl),
+        )
+        with self.lock:
+            self.escrituras += 1
+            purgar = self.purgar_cada > 0 and self.escrituras % self.purgar_cada == 0
+        if purgar:
+            self.purge()
+
+    def delete(self, clave: str):
+        self._conexion().execute("DELETE FROM cache WHERE clave = ?", (clave,))
+
+    def purge(self) -> int:
+        """Elimina las entradas vencidas."""
+        return self._conexion().execute("DELETE FROM cache WHERE expira <= ?", (time.time(),)).rowcount
+
+
+class TieredCache:
+    def __init__(self, l1: MemoryCache, l2: FileCache | None = None):
+        self.l1 = l1
+        self.l2 = l2
+        self.stats = {"hits_l1": 0, "hits_l2": 0, "misses": 0, "errores_l2": 0}
+
+    def _ttl_l1(self, ttl: float) -> float:
+        return min(ttl, CACHE_L1_TTL) if self.l2 else ttl
+
+    def get(self, clave: str):
+        valor = self.l1.get(clave)
+        if valor is not None:
+            self.stats["hits_l1"] += 1
+            return valor
+        if self.l2 is not None:
+            try:
+                valor = self.l2.get(clave)
+            except sqlite3.Error:
+                self.stats["errores_l2"] += 1
+                valor = None
+            if valor is not None:
+                self.stats["hits_l2"] += 1
+                self.l1.set(clave, valor, CACHE_L1_TTL)
+                return valor
+        self.stats["misses"] += 1
+        return None
+
+    def set(self, clave: str, valor, ttl: float):
+        """Guarda un valor (None no se guarda)."""
+        if valor is None:
+            return
+        self.l1.set(clave, valor, self._ttl_l1(ttl))
+        if self.l2 is not None:
+            try:
+                self.l2.set(clave, valor, ttl)
+            except sqlite3.Error:
+                self.stats["errores_l2"] += 1
+
+    def delete(self, clave: str):
+        self.l1.delete(clave)
+        if self.l2 is not None:
+            try:
+                self.l2.delete(clave)
+            except sqlite3.Error:
+                self.stats["errores_l2"] += 1
+
+    def get_or_set(self, clave: str, ttl: float, cargar):
+        """Devuelve el valor en caché o lo calcula con cargar() y lo guarda."""
+        valor = self.get(clave)
+        if valor is None:
+            valor = cargar()
+            self.set(clave, valor, ttl)
+        return valor
+
+    def status(self) -> dict:
+        return {"backend": CACHE_BACKEND, "l1_items": len(self.l1.datos), **self.stats}
+
+
+cache = TieredCache(MemoryCache(), FileCache() if CACHE_BACKEND == "archivo" else None)
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from .text_normalization import normalize_text
+
+# =====================================================
+# ===== Clasificador de intención por centroides ======
+# =====================================================
+# Cada intención se representa con el centroide de los vectores promedio
+# (doc.vector de spaCy) de sus ejemplos. La inferencia compara el texto
+# solo contra un centroide por intención, así que su costo no depende del
+# número de ejemplos. La confianza es un softmax calibrado con temperatura.
+
+TEMPERATURAS = [0.01, 0.02, 0.03, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3, 0.5, 1.0]
+
+
+def _unitario(matriz: np.ndarray) -> np.ndarray:
+    normas = np.linalg.norm(matriz, axis=-1, keepdims=True)
+    normas[normas == 0] = 1.0
+    return matriz / normas
+
+
+def _softmax(puntajes: np.ndarray, temperatura: float) -> np.ndarray:
+    z = puntajes / temperatura
+    z = z - z.max(axis=-1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+def load_labelled_logs(path: str | None) -> list[tuple[str, str]]:
+    """
+    Lee ejemplos etiquetados desde un archivo JSONL con líneas
+    {"texto": "...", "intencion": "..."}. Si no existe, devuelve [].
+    """
+    if not path or not os.path.exists(path):
+        return []
+    ejemplos = []
+    with open(path, encoding="utf-8") as f:
+        for linea in f:
+            linea = linea.strip()
+            if not linea:
+                continue
+            registro = json.loads(linea)
+            texto = registro.get("texto")
+            intencion = registro.get("intencion")
+            if texto and intencion:
+                ejemplos.append((texto, intencion))
+    return ejemplos
+
+
+def training_fingerprint(intent_examples: dict, extra: list[tuple[str, str]] | None = None) -> str:
+    """Hash de los ejemplos de entrenamiento; cambia si se agrega o edita alguno."""
+    datos = {
+        "ejemplos": {i: list(e) for i, e in sorted(intent_examples.items())},
+        "extra": [list(par) for par in extra or []],
+    }
+    return hashlib.sha256(json.dumps(datos, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class IntentClassifier:
+    def __init__(self, etiquetas: list[str], centroides: np.ndarray, temperatura: float, huella: str = ""):
+        self.etiquetas = list(etiquetas)
+        self.centroides = _unitario(centroides.astype(np.float32))
+        self.temperatura = float(temperatura)
+        self.huella = huella  # training_fingerprint de los datos con que se entrenó
+
+    # ---------------- Entrenamiento ----------------
+    @classmethod
+    def train(cls, nlp, intent_examples: dict, extra: list[tuple[str, str]] | None = None):
+        """
+        Entrena el clasificador con INTENT_EXAMPLES y, opcionalmente, con
+        ejemplos etiquetados extra (por ejemplo, logs revisados).
+        Cada ejemplo se incluye en su forma original y normalizada (sin
+        acentos, minúsculas), que es como llega el texto desde la API.
+        """
+        pares = [(e, i) for i, ejemplos in intent_examples.items() for e in ejemplos]
+        pares += list(extra or [])
+
+        textos, etiquetas_ej, vistos = [], [], set()
+        for texto, intencion in pares:
+            for variante in (texto, normalize_text(texto)):
+                if (variante, intencion) not in vistos:
+                    vistos.add((variante, intencion))
+                    textos.append(variante)
+                    etiquetas_ej.append(intencion)
+
+        etiquetas = sorted(set(etiquetas_ej))
+        y = np.array([etiquetas.index(e) for e in etiquetas_ej])
+        X = _unitario(np.array([doc.vector for doc in nlp.pipe(textos)], dtype=np.float32))
+
+        sumas = np.zeros((len(etiquetas), X.shape[1]), dtype=np.float32)
+        np.add.at(sumas, y, X)
+        conteos = np.bincount(y, minlength=len(etiquetas)).astype(np.float32)
+
+        temperatura = cls._calibrar_temperatura(X, y, sumas, conteos)
+        return cls(etiquetas, sumas / conteos[:, None], temperatura, training_fingerprint(intent_examples, extra))
+
+    @staticmethod
+    def _calibrar_temperatura(X, y, sumas, conteos) -> float:
+        """
+        Elige la temperatura que minimiza la log-verosimilitud negativa
+        con centroides leave-one-out (cada ejemplo se evalúa contra un
+        centroide de su clase calculado sin él), para no sobreajustar.
+        """
+        puntajes = X @ _unitario(sumas / conteos[:, None]).T
+        filas = np.arange(len(y))
+        restante = conteos[y] - 1
+        propio = sumas[y] - X
+        valido = restante > 0
+        propio[valido] /= restante[valido, None]
+        puntajes[filas[valido], y[valido]] = np.sum(X[valido] * _unitario(propio[valido]), axis=1)
+
+        mejor_t, mejor_nll = 1.0, float("inf")
+        for t in TEMPERATURAS:
+            probs = _softmax(puntajes, t)
+            nll = -np.mean(np.log(probs[filas, y] + 1e-12))
+            if nll < mejor_nll:
+                mejor_t, mejor_nll = t, nll
+        return mejor_t
+
+    # ---------------- Persistencia ----------------
+    def save(self, path: str):
+        # Se escribe aparte y se reemplaza: otro proceso nunca lee un .npz a medias
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temporal = f"{path}.{os.getpid()}.tmp"
+        with open(temporal, "wb") as f:
+            np.savez(
+                f,
+                etiquetas=np.array(self.etiquetas),
+                centroides=self.centroides,
+                temperatura=np.array(self.temperatura),
+                huella=np.array(self.huella),
+            )
+        os.replace(temporal, path)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                [str(e) for e in data["etiquetas"]],
+                data["centroides"],
+                float(data["temperatura"]),
+                str(data["huella"]) if "huella" in data.files else "",
+            )
+
+    # ---------------- Inferencia ----------------
+    def predict(self, vector: np.ndarray) -> tuple[str, float]:
+        """Devuelve (intención, confianza) para un doc.vector."""
+        x = _unitario(np.asarray(vector, dtype=np.float32))
+        probs = _softmax(self.centroides @ x, self.temperatura)
+        idx = int(np.argmax(probs))
+        return self.etiquetas[idx], float(probs[idx])
+
+
+if __name__ == "__main__":
+    # Reentrenar y guardar el modelo: python -m services.intent_classifier
+    from services.intentions import INTENT_EXAMPLES, INTENT_LOGS_PATH, INTENT_MODEL_PATH, nlp
+
+    clf = IntentClassifier.train(nlp, INTENT_EXAMPLES, load_labelled_logs(INTENT_LOGS_PATH))
+    clf.save(INTENT_MODEL_PATH)
+    print(f"Modelo guardado en {INTENT_MODEL_PATH} (T={clf.temperatura}, intenciones={clf.etiquetas})")
@@ -1,9 +1,26 @@
 from typing import Optional
 
+import fcntl
+import os
 import re
 import spacy
 import statistics
-import unicodedata
+from dotenv import load_dotenv
+
+from .intent_classifier import IntentClassifier, load_labelled_logs, training_fingerprint
+from .text_normalization import normalize_text_uncached
+
+load_dotenv()
+
+# Motor de intención: "similitud" (comparación contra cada ejemplo)
+# o "clasificador" (centroides entrenados, costo constante por consulta)
+INTENT_ENGINE = os.getenv("INTENT_ENGINE", "similitud")
+INTENT_MODEL_PATH = os.getenv(
+    "INTENT_MODEL_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "data", "intent_classifier.npz"),
+)
+INTENT_LOGS_PATH = os.getenv("INTENT_LOGS_PATH")
+INTENT_MIN_CONFIANZA = float(os.getenv("INTENT_MIN_CONFIANZA", "0.5"))
 
 # Cargar modelo pequeño de español
 print("Loading spaCy ...")
@@ -65,6 +82,14 @@ INTENT_EXAMPLES = {
     ],
 }
 
+# Ejemplos procesados una sola vez al importar (antes del fork si se usa
+# gunicorn con preload_app, así los workers comparten estas páginas)
+INTENT_EXAMPLE_DOCS = [
+    (intencion, doc)
+    for intencion, ejemplos in INTENT_EXAMPLES.items()
+    for doc in nlp.pipe(ejemplos)
+]
+
 
 def detect_intention(mensaje: str) -> dict:
     """
@@ -72,8 +97,7 @@ def detect_intention(mensaje: str) -> dict:
     Retorna un diccionario con 'intencion' y 'parametros' (si aplica).
     """
     # Normalizar texto: quitar acentos, pasar a minúsculas
-    texto = unicodedata.normalize("NFD", mensaje)
-    texto = texto.encode("ascii", "ignore").decode("utf-8").lower()
+    texto = normalize_text_uncached(mensaje)
 
     # --- Intención 1: nueva recomendación ---
     patrones_recomendacion = [
@@ -284,6 +308,34 @@ def detect_intention_spacy_old(texto: str, umbral: float = 0.55):
 
 
 def detect_intention_spacy(texto: str):
+    """
+    Detecta la intención con el motor configurado en INTENT_ENGINE.
+    """
+    if intent_classifier is not None:
+        return detect_intention_classifier(texto)
+    return detect_intention_similarity(texto)
+
+
+def detect_intention_classifier(texto: str):
+    """
+    Clasifica el texto contra los centroides entrenados.
+    La confianza es una probabilidad calibrada; por debajo de
+    INTENT_MIN_CONFIANZA se considera 'no_implementada'.
+    """
+    doc = nlp(texto)
+    intencion, confianza = intent_classifier.predict(doc.vector)
+    if confianza < INTENT_MIN_CONFIANZA:
+        intencion = "no_implementada"
+
+    return {
+        "intencion": intencion,
+        "similitud": round(confianza, 2),
+        "confianza": round(confianza, 2),
+        "consulta": _extract_after_prep(doc)
+    }
+
+
+def detect_intention_similarity(texto: str):
     doc = nlp(texto)
     sims_globales = []
 
@@ -291,13 +343,12 @@ def detect_intention_spacy(texto: str):
     mejor_sim = 0.0
 
     # 1. Calcular todas las similitudes
-    for intencion, ejemplos in INTENT_EXAMPLES.items():
-        for ejemplo in ejemplos:
-            sim = doc.similarity(nlp(ejemplo))
-            sims_globales.append((intencion, sim))
-            if sim > mejor_sim:
-                mejor_sim = sim
-                mejor_intencion = intencion
+    for intencion, ejemplo_doc in INTENT_EXAMPLE_DOCS:
+        sim = doc.similarity(ejemplo_doc)
+        sims_globales.append((intencion, sim))
+        if sim > mejor_sim:
+            mejor_sim = sim
+            mejor_intencion = intencion
 
     # 2. Calcular media y desviación estándar global
     valores = [s for _, s in sims_globales]
@@ -317,3 +368,30 @@ def detect_intention_spacy(texto: str):
         "media": round(media, 2),
         "consulta": _extract_after_prep(doc)
     }
+
+
+# =====================================================
+# ========= Carga del clasificador al iniciar =========
+# =====================================================
+def load_intent_classifier(path: str = INTENT_MODEL_PATH) -> IntentClassifier:
+    """
+    Carga el clasificador serializado. Si no existe, o si INTENT_EXAMPLES o
+    los logs etiquetados cambiaron desde que se entrenó, lo reentrena y lo
+    guarda.
+    """
+    logs = load_labelled_logs(INTENT_LOGS_PATH)
+    huella = training_fingerprint(INTENT_EXAMPLES, logs)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Los workers arrancan a la vez: solo uno reentrena, los demás esperan y cargan
+    with open(path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(path):
+            clf = IntentClassifier.load(path)
+            if clf.huella == huella:
+                return clf
+        clf = IntentClassifier.train(nlp, INTENT_EXAMPLES, logs)
+        clf.save(path)
+        return clf
+
+
+intent_classifier = load_intent_classifier() if INTENT_ENGINE == "clasificador" else None
@@ -0,0 +1,163 @@
+import fcntl
+import json
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from .text_normalization import normalize_key
+
+load_dotenv()
+
+# =====================================================
+# ======= Diccionario local keyword -> ID de TMDB ======
+# =====================================================
+# Evita la llamada a /search/keyword en las búsquedas por keyword.
+# Los géneros usan los IDs fijos de TMDB (/genre/movie/list) y se filtran
+# con with_genres; el resto de términos se resuelve una vez contra TMDB y
+# se guarda en KEYWORD_IDS_PATH (incluyendo los que no tienen resultado).
+# Los términos sin resultado caducan tras KEYWORD_NEGATIVA_TTL segundos,
+# porque TMDB agrega keywords nuevas. Cada worker vuelve a leer el archivo
+# cuando cambia su mtime, así ve lo que resolvieron los demás.
+
+KEYWORD_IDS_PATH = os.getenv(
+    "KEYWORD_IDS_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "data", "keyword_ids.json"),
+)
+KEYWORD_NEGATIVA_TTL = int(os.getenv("KEYWORD_NEGATIVA_TTL", str(7 * 24 * 3600)))
+
+GENEROS_TMDB = {
+    "accion": 28,
+    "aventura": 12,
+    "aventuras": 12,
+    "animacion": 16,
+    "animadas": 16,
+    "comedia": 35,
+    "crimen": 80,
+    "policiaca": 80,
+    "documental": 99,
+    "documentales": 99,
+    "drama": 18,
+    "familia": 10751,
+    "familiar": 10751,
+    "fantasia": 14,
+    "historia": 36,
+    "historicas": 36,
+    "terror": 27,
+    "horror": 27,
+    "miedo": 27,
+    "musica": 10402,
+    "musicales": 10402,
+    "misterio": 9648,
+    "romance": 10749,
+    "romanticas": 10749,
+    "amor": 10749,
+    "ciencia ficcion": 878,
+    "suspenso": 53,
+    "suspense": 53,
+    "thriller": 53,
+    "guerra": 10752,
+    "belicas": 10752,
+    "western": 37,
+    "vaqueros": 37,
+}
+
+# Temáticas frecuentes que se resuelven de antemano con
+# `python -m services.keyword_ids`
+TEMAS_COMUNES = [
+    "superheroes",
+    "zombies",
+    "vampiros",
+    "viajes en el tiempo",
+    "navidad",
+    "dinosaurios",
+    "extraterrestres",
+    "robots",
+    "espacio",
+    "distopia",
+    "basada en hechos reales",
+    "deportes",
+    "mafia",
+    "piratas",
+    "brujas",
+    "inteligencia artificial",
+]
+
+
+class KeywordDictionary:
+    def __init__(self, path: str = KEYWORD_IDS_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.entradas = self._leer()
+
+    def _mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _leer(self) -> dict:
+        self.mtime = self._mtime()
+        if self.mtime is None:
+            return {}
+        with open(self.path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _refrescar(self):
+        """Relee el archivo si otro proceso lo reescribió."""
+        if self._mtime() != self.mtime:
+            with self.lock:
+                if self._mtime() != self.mtime:
+                    self.entradas = self._leer()
+
+    def get(self, termino: str):
+        """
+        Devuelve {"tipo": "genero" | "keyword", "id": int | None} si el término
+        ya es conocido, o None si hay que resolverlo en TMDB.
+        """
+        clave = normalize_key(termino)
+        if clave in GENEROS_TMDB:
+            return {"tipo": "genero", "id": GENEROS_TMDB[clave]}
+        self._refrescar()
+        entrada = self.entradas.get(clave)
+        if entrada is not None and entrada["id"] is None:
+            # Sin resultado: se vuelve a consultar cuando caduca
+            if time.time() - entrada.get("guardado", 0) >= KEYWORD_NEGATIVA_TTL:
+                return None
+        return entrada
+
+    def put(self, termino: str, keyword_id: int | None) -> dict:
+        """Guarda el ID resuelto (o None si TMDB no tiene esa keyword)."""
+        clave = normalize_key(termino)
+        entrada = {"tipo": "keyword", "id": keyword_id}
+        if keyword_id is None:
+            entrada["guardado"] = int(time.time())
+        with self.lock:
+            self._guardar(clave, entrada)
+        return entrada
+
+    def _guardar(self, clave: str, entrada: dict):
+        # Otros workers pueden haber agregado términos: se parte de lo que hay en disco
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            entradas = {**self._leer(), clave: entrada}
+            temporal = f"{self.path}.{os.getpid()}.tmp"
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(entradas, f, ensure_ascii=False, indent=1, sort_keys=True)
+            os.replace(temporal, self.path)
+            self.entradas = entradas
+            self.mtime = self._mtime()
+
+
+keyword_ids = KeywordDictionary()
+
+
+if __name__ == "__main__":
+    # Precargar las temáticas comunes: python -m services.keyword_ids
+    from services.recommendations import resolve_keyword
+
+    for tema in TEMAS_COMUNES:
+        print(f"{tema}: {resolve_keyword(tema)}")
@@ -0,0 +1,294 @@
+import fcntl
+import json
+import os
+import threading
+
+import numpy as np
+from dotenv import load_dotenv
+
+from .backendless_client import CAMPOS_PELICULA, backendless_get
+from .intentions import nlp
+from .text_normalization import normalize_key
+
+load_dotenv()
+
+# =====================================================
+# ======= Índice vectorial local de películas =========
+# =====================================================
+# Cada película se representa con el vector promedio (spaCy) de su
+# sinopsis, guardado en una matriz float16 mapeada en memoria. Los
+# metadatos van en un JSONL de solo-anexar; la última línea de cada
+# mdb_id es la vigente. Varios procesos (workers) pueden compartir el
+# índice: las escrituras se serializan con flock y cada proceso lee las
+# líneas nuevas que agregaron los demás. Una reconstrucción reemplaza
+# ambos archivos con os.replace; los procesos lo detectan por el cambio
+# de inodo del JSONL y recargan el índice completo.
+
+MOVIE_INDEX_DIR = os.getenv(
+    "MOVIE_INDEX_DIR",
+    os.path.join(os.path.dirname(__file__), "..", "data", "movie_index"),
+)
+# Umbral sobre la similitud coseno *centrada* (ver similar()). Los vectores
+# de spaCy son promedios de palabras y dos sinopsis en español cualesquiera
+# comparten artículos, preposiciones y verbos comunes: su coseno crudo suele
+# quedar en 0.8-0.9 aunque no tengan nada que ver, y un umbral de 0.6 no
+# filtraría nada. Restando el centroide del índice esa componente común
+# desaparece, las sinopsis no relacionadas quedan alrededor de 0 y 0.6 exige
+# un parecido temático claro. Ajustable por entorno si el modelo cambia.
+MOVIE_INDEX_MIN_SIM = float(os.getenv("MOVIE_INDEX_MIN_SIM", "0.6"))
+# Con menos películas el centroide no representa "una sinopsis cualquiera"
+# y no se busca localmente (se usa TMDB /similar)
+MOVIE_INDEX_MIN_PELICULAS = int(os.getenv("MOVIE_INDEX_MIN_PELICULAS", "100"))
+CAPACIDAD_INICIAL = 1024
+# Filas por bloque al calcular similitudes (evita copiar toda la matriz a float32)
+BLOQUE_SIMILITUD = 4096
+
+
+class MovieIndex:
+    def __init__(self, directorio: str, dim: int):
+        self.directorio = directorio
+        self.dim = dim
+        self.ruta_vectores = os.path.join(directorio, "vectores.f16")
+        self.ruta_meta = os.path.join(directorio, "peliculas.jsonl")
+        self.ruta_lock = os.path.join(directorio, "indice.lock")
+        self.lock = threading.Lock()
+        self._cargar()
+
+    # ---------------- Persistencia ----------------
+    def _cargar(self):
+        os.makedirs(self.directorio, exist_ok=True)
+        self.peliculas = []   # fila -> metadatos
+        self.filas = {}       # mdb_id -> fila
+        self.titulos = {}     # titulo normalizado -> mdb_id
+        self.offset_meta = 0  # bytes del JSONL ya leídos
+        self.inodo_meta = None  # generación del JSONL leído
+        self.centroide = None   # promedio de los vectores (ver _centroide)
+        self.filas_centroide = 0
+
+        self._leer_nuevas()
+        self._abrir_matriz(max(CAPACIDAD_INICIAL, len(self.peliculas)))
+
+    def _aplicar(self, registro: dict, fila: int):
+        if fila == len(self.peliculas):
+            self.peliculas.append(registro)
+        else:
+            self.peliculas[fila] = registro
+        self.filas[registro["mdb_id"]] = fila
+        self.titulos[normalize_key(registro.get("titulo"))] = registro["mdb_id"]
+
+    def _leer_nuevas(self):
+        """Aplica las líneas del JSONL agregadas desde la última lectura."""
+        try:
+            estado = os.stat(self.ruta_meta)
+        except FileNotFoundError:
+            return
+        if self.inodo_meta is not None and (
+            estado.st_ino != self.inodo_meta or estado.st_size < self.offset_meta
+        ):
+            # Otro proceso reconstruyó el índice: se recarga desde cero
+            self._cargar()
+            return
+        if estado.st_size <= self.offset_meta:
+            return
+        with open(self.ruta_meta, "rb") as f:
+            if os.fstat(f.fileno()).st_ino != estado.st_ino:
+                return  # reemplazado entre stat y open: se recarga en la próxima lectura
+            self.inodo_meta = estado.st_ino
+            f.seek(self.offset_meta)
+            for linea in f:
+                if not linea.endswith(b"\n"):
+                    break  # línea a medio escribir por otro proceso
+                self.offset_meta += len(linea)
+                if linea.strip():
+                    registro = json.loads(linea)
+                    self._aplicar(registro, registro.pop("_fila"))
+
+    def _refrescar(self):
+        with self.lock:
+            self._leer_nuevas()
+
+    def _abrir_matriz(self, capacidad: int):
+        if os.path.exists(self.ruta_vectores):
+            # Otro proceso pudo haber agrandado la matriz
+            capacidad = max(capacidad, os.path.getsize(self.ruta_vectores) // (2 * self.dim))
+        tam = capacidad * self.dim * 2
+        with open(self.ruta_vectores, "ab") as f:
+            if f.tell() < tam:
+                f.truncate(tam)
+        self.capacidad = capacidad
+        self.matriz = np.memmap(self.ruta_vectores, dtype=np.float16, mode="r+", shape=(capacidad, self.dim))
+
+    def _ajustar_matriz(self, filas: int):
+        """Reabre la matriz si otro proceso la agrandó, y la agranda si faltan filas."""
+        en_disco = os.path.getsize(self.ruta_vectores) // (2 * self.dim)
+        if en_disco > self.capacidad or filas > self.capacidad:
+            self.matriz.flush()
+            capacidad = self.capacidad
+            while capacidad < filas:
+                capacidad *= 2
+            self._abrir_matriz(max(capacidad, en_disco))
+
+    # ---------------- Actualización ----------------
+    def _embed(self, pelicula: dict) -> np.ndarray:
+        texto = pelicula.get("sinopsis") or pelicula.get("titulo") or ""
+        v = nlp(texto).vector.astype(np.float32)
+        norma = np.linalg.norm(v)
+        return v / norma if norma > 0 else v
+
+    def add(self, pelicula: dict):
+        """
+        Agrega (o reemplaza) una película de Backendless en el índice.
+        """
+        if not isinstance(pelicula, dict) or not pelicula.get("mdb_id"):
+            return
+        registro = {c: pelicula.get(c) for c in CAMPOS_PELICULA}
+        registro["mdb_id"] = str(registro["mdb_id"])
+        vector = self._embed(registro)
+
+        with self.lock, open(self.ruta_lock, "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._leer_nuevas()
+            fila = self.filas.get(registro["mdb_id"], len(self.peliculas))
+            self._ajustar_matriz(fila + 1)
+            self.matriz[fila] = vector
+            self.matriz.flush()
+            linea = (json.dumps({**registro, "_fila": fila}, ensure_ascii=False) + "\n").encode("utf-8")
+            with open(self.ruta_meta, "ab") as f:
+                f.write(linea)
+                self.inodo_meta = os.fstat(f.fileno()).st_ino
+            self.offset_meta += len(linea)
+            self._aplicar(registro, fila)
+
+    def contains(self, mdb_id) -> bool:
+        self._refrescar()
+        return str(mdb_id) in self.filas
+
+    def rebuild(self, page_size: int = 100) -> int:
+        """
+        Reconstruye el índice completo a partir de la tabla peliculas.
+        Escribe archivos temporales y los reemplaza bajo el flock, así que
+        los demás procesos nunca ven un índice a medio escribir.
+        """
+        registros, filas = [], {}
+        offset = 0
+        while True:
+            pagina = backendless_get(
+                "peliculas",
+                {"pageSize": page_size, "offset": offset, "sortBy": "created asc"},
+                props=CAMPOS_PELICULA,
+            )
+            if not isinstance(pagina, list) or not pagina:
+                break
+            for pelicula in pagina:
+                if not isinstance(pelicula, dict) or not pelicula.get("mdb_id"):
+                    continue
+                registro = {c: pelicula.get(c) for c in CAMPOS_PELICULA}
+                registro["mdb_id"] = str(registro["mdb_id"])
+                filas.setdefault(registro["mdb_id"], len(filas))
+                registros.append(registro)
+            offset += len(pagina)
+
+        temporal_vectores = f"{self.ruta_vectores}.{os.getpid()}.tmp"
+        temporal_meta = f"{self.ruta_meta}.{os.getpid()}.tmp"
+        capacidad = max(CAPACIDAD_INICIAL, len(filas))
+        matriz = np.memmap(temporal_vectores, dtype=np.float16, mode="w+", shape=(capacidad, self.dim))
+        with open(temporal_meta, "wb") as f:
+            for registro in registros:
+                fila = filas[registro["mdb_id"]]
+                matriz[fila] = self._embed(registro)
+                f.write((json.dumps({**registro, "_fila": fila}, ensure_ascii=False) + "\n").encode("utf-8"))
+        matriz.flush()
+        del matriz
+
+        with self.lock, open(self.ruta_lock, "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # Primero los vectores: quien vea el JSONL nuevo ya encuentra su matriz
+            os.replace(temporal_vectores, self.ruta_vectores)
+            os.replace(temporal_meta, self.ruta_meta)
+            self._cargar()
+        return len(self.peliculas)
+
+    # ---------------- Consultas ----------------
+    def find_by_title(self, titulo: str):
+        """
+        Busca una película por título exacto (sin acentos ni mayúsculas).
+        Si no está indexada devuelve None y la búsqueda sigue en TMDB.
+        """
+        clave = normalize_key(titulo)
+        if not clave:
+            return None
+        with self.lock:
+            self._leer_nuevas()
+            mdb_id = self.titulos.get(clave)
+            if mdb_id is None:
+                return None
+            return self.peliculas[self.filas[mdb_id]]
+
+    def _centroide(self, n: int) -> np.ndarray:
+        """
+        Promedio de las n primeras filas. Se recalcula cuando el índice
+        creció más de un 10% (o se recargó); llamar con self.lock tomado.
+        """
+        if self.centroide is None or not self.filas_centroide <= n <= self.filas_centroide * 1.1:
+            suma = np.zeros(self.dim, dtype=np.float64)
+            for inicio in range(0, n, BLOQUE_SIMILITUD):
+                suma += self.matriz[inicio:min(inicio + BLOQUE_SIMILITUD, n)].sum(axis=0, dtype=np.float64)
+            self.centroide = (suma / max(n, 1)).astype(np.float32)
+            self.filas_centroide = n
+        return self.centroide
+
+    def similar(self, mdb_id, k: int = 5, min_sim: float = MOVIE_INDEX_MIN_SIM) -> list[tuple[dict, float]]:
+        """
+        Devuelve hasta k vecinos más cercanos a la película indicada,
+        excluyéndola y descartando los que no alcanzan min_sim. La
+        similitud es el coseno entre vectores centrados (menos el
+        centroide del índice), calculado por bloques sin copiar la matriz.
+        """
+        with self.lock:
+            self._leer_nuevas()
+            fila = self.filas.get(str(mdb_id))
+            if fila is None:
+                return []
+            n = len(self.peliculas)
+            if n < MOVIE_INDEX_MIN_PELICULAS:
+                return []
+            self._ajustar_matriz(n)
+            # Copias locales: una recarga posterior reemplaza estos objetos
+            # y la lista solo crece, así que las filas < n siguen válidas
+            peliculas, matriz = self.peliculas, self.matriz
+            centroide = self._centroide(n)
+
+        consulta = np.asarray(matriz[fila], dtype=np.float32)
+        referencias = np.stack([consulta, centroide], axis=1)   # dim x 2
+        consulta_c = float(consulta @ centroide)
+        norma_c = float(centroide @ centroide)
+        norma_consulta = np.sqrt(max(float(consulta @ consulta) - 2 * consulta_c + norma_c, 1e-12))
+
+        # (v - c)·(q - c) = v·q - v·c - q·c + c·c  y  |v - c|² = v·v - 2 v·c + c·c
+        puntajes = np.empty(n, dtype=np.float32)
+        for inicio in range(0, n, BLOQUE_SIMILITUD):
+            fin = min(inicio + BLOQUE_SIMILITUD, n)
+            bloque = np.asarray(matriz[inicio:fin], dtype=np.float32)
+            productos = bloque @ referencias
+            con_centroide = productos[:, 1]
+            normas = np.einsum("ij,ij->i", bloque, bloque) - 2 * con_centroide + norma_c
+            puntajes[inicio:fin] = (productos[:, 0] - con_centroide - consulta_c + norma_c) / (
+                np.sqrt(np.maximum(normas, 1e-12)) * norma_consulta
+            )
+        puntajes[fila] = -np.inf
+
+        k = min(k, n - 1)
+        if k <= 0:
+            return []
+        top = np.argpartition(-puntajes, k - 1)[:k]
+        top = top[np.argsort(-puntajes[top])]
+        return [(peliculas[i], float(puntajes[i])) for i in top if puntajes[i] >= min_sim]
+
+
+movie_index = MovieIndex(MOVIE_INDEX_DIR, nlp.vocab.vectors_length)
+
+
+if __name__ == "__main__":
+    # Reconstruir el índice desde Backendless: python -m services.movie_index
+    total = movie_index.rebuild()
+    print(f"Índice reconstruido con {total} películas en {MOVIE_INDEX_DIR}")
@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from dotenv import load_dotenv
+
+from .resilience import DeadlineExceeded
+
+load_dotenv()
+
+# =====================================================
+# ======== Limitador de tasa adaptativo (TMDB) ========
+# =====================================================
+# Token bucket + límite de concurrencia AIMD: cada respuesta 429 reduce a
+# la mitad las llamadas simultáneas y pausa el bucket según Retry-After;
+# las respuestas correctas lo vuelven a subir de a uno. Las peticiones que
+# no caben esperan en cola hasta su plazo en lugar de descartarse.
+
+TMDB_RATE = float(os.getenv("TMDB_RATE", "40"))           # tokens por segundo
+TMDB_BURST = int(os.getenv("TMDB_BURST", "20"))
+TMDB_MAX_CONCURRENCIA = int(os.getenv("TMDB_MAX_CONCURRENCIA", "20"))
+RETRY_AFTER_DEFECTO = 1.0
+
+
+def parse_retry_after(valor: str | None) -> float:
+    """Convierte la cabecera Retry-After (segundos o fecha HTTP) a segundos."""
+    if not valor:
+        return RETRY_AFTER_DEFECTO
+    try:
+        return max(float(valor), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(valor).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return RETRY_AFTER_DEFECTO
+
+
+class AdaptiveRateLimiter:
+    def __init__(self, rate: float, burst: int, max_concurrencia: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrencia = max_concurrencia
+        self.limite = max_concurrencia
+        self.tokens = float(burst)
+        self.ultimo = time.monotonic()
+        self.en_curso = 0
+        self.pausa_hasta = 0.0
+        self.ventana_hasta = 0.0  # fin de la ventana de congestión actual
+        self.exitos_seguidos = 0
+        self.cond = threading.Condition()
+        self.stats = {
+            "adquiridos": 0,
+            "en_cola": 0,
+            "espera_total_s": 0.0,
+            "espera_max_s": 0.0,
+            "rechazos_por_plazo": 0,
+            "respuestas_429": 0,
+        }
+
+    def _recargar(self, ahora: float):
+        self.tokens = min(self.burst, self.tokens + (ahora - self.ultimo) * self.rate)
+        self.ultimo = ahora
+
+    def acquire(self, timeout: float | None = None):
+        """
+        Espera un token y un lugar de concurrencia. Si no se obtienen antes
+        de 'timeout' segundos, lanza DeadlineExceeded.
+        """
+        inicio = time.monotonic()
+        limite_t = inicio + timeout if timeout is not None else None
+        with self.cond:
+            self.stats["en_cola"] += 1
+            try:
+                while True:
+                    ahora = time.monotonic()
+                    self._recargar(ahora)
+                    if ahora < self.pausa_hasta:
+                        espera = self.pausa_hasta - ahora
+                    elif self.en_curso >= self.limite:
+                        espera = None  # hasta que alguien libere su lugar
+                    elif self.tokens < 1:
+                        espera = (1 - self.tokens) / self.rate
+                    else:
+                        self.tokens -= 1
+                        self.en_curso += 1
+                        esperado = ahora - inicio
+                        self.stats["adquiridos"] += 1
+                        self.stats["espera_total_s"] += esperado
+                        self.stats["espera_max_s"] = max(self.stats["espera_max_s"], esperado)
+                        return
+
+                    if limite_t is not None:
+                        restante = limite_t - ahora
+                        if restante <= 0:
+                            self.stats["rechazos_por_plazo"] += 1
+                            raise DeadlineExceeded("Plazo agotado esperando turno para TMDB")
+                        espera = restante if espera is None else min(espera, restante)
+                    self.cond.wait(espera)
+            finally:
+                self.stats["en_cola"] -= 1
+
+    def release(self, status_code: int | None = None, retry_after: str | None = None):
+        """Libera el lugar y ajusta la concurrencia según la respuesta."""
+        with self.cond:
+            self.en_curso -= 1
+            if status_code == 429:
+                self.stats["respuestas_429"] += 1
+                ahora = time.monotonic()
+                espera = parse_retry_after(retry_after)
+                if ahora >= self.ventana_hasta:
+                    # Una sola reducción por ventana: los 429 de peticiones que
+                    # ya estaban en vuelo responden a la misma congestión
+                    self.limite = max(1, self.limite // 2)
+                    self.ventana_hasta = ahora + max(espera, RETRY_AFTER_DEFECTO)
+                self.exitos_seguidos = 0
+                self.pausa_hasta = max(self.pausa_hasta, ahora + espera)
+            elif status_code is not None and status_code < 500:
+                self.exitos_seguidos += 1
+                if self.exitos_seguidos >= self.limite and self.limite < self.max_concurrencia:
+                    self.limite += 1
+                    self.exitos_seguidos = 0
+            self.cond.notify_all()
+
+    def status(self) -> dict:
+        with self.cond:
+            adquiridos = self.stats["adquiridos"]
+            return {
+                **self.stats,
+                "espera_promedio_s": round(self.stats["espera_total_s"] / adquiridos, 4) if adquiridos else 0.0,
+                "concurrencia_limite": self.limite,
+                "en_curso": self.en_curso,
+            }
+
+
+tmdb_limiter = AdaptiveRateLimiter(TMDB_RATE, TMDB_BURST, TMDB_MAX_CONCURRENCIA)
@@ -0,0 +1,260 @@
+import os
+import sqlite3
+import threading
+
+from dotenv import load_dotenv
+
+from .backendless_client import backendless_get
+from .text_normalization import normalize_key
+
+load_dotenv()
+
+# =====================================================
+# ========= Agregados de evaluaciones (ratings) ========
+# =====================================================
+# Conteo y suma de evaluaciones por película y por consulta normalizada,
+# actualizados en O(1) con cada PATCH /evaluar. La tabla evaluaciones
+# guarda el último valor de cada detalle para poder corregir una
+# re-evaluación sin escanear detalleRecomendaciones.
+
+RATINGS_DB_PATH = os.getenv(
+    "RATINGS_DB_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "data", "ratings.sqlite3"),
+)
+# Promedio bayesiano: cada película parte con RATING_PREVIAS evaluaciones
+# ficticias de valor RATING_PRIOR, para no premiar una sola evaluación alta.
+RATING_PRIOR = 2.5
+RATING_PREVIAS = 3
+# Peso del rating frente al orden original de TMDB al re-ordenar
+RATING_PESO = float(os.getenv("RATING_PESO", "1.0"))
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS por_pelicula (
+    pelicula_id TEXT PRIMARY KEY,
+    mdb_id TEXT,
+    titulo TEXT,
+    n INTEGER NOT NULL DEFAULT 0,
+    suma REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS por_pelicula_mdb ON por_pelicula (mdb_id);
+CREATE TABLE IF NOT EXISTS por_consulta (
+    consulta TEXT PRIMARY KEY,
+    n INTEGER NOT NULL DEFAULT 0,
+    suma REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS evaluaciones (
+    detalle_id TEXT PRIMARY KEY,
+    pelicula_id TEXT,
+    consulta TEXT,
+    valor REAL NOT NULL
+);
+"""
+
+
+def bayesian_average(n: int, suma: float) -> float:
+    return (suma + RATING_PREVIAS * RATING_PRIOR) / (n + RATING_PREVIAS)
+
+
+class RatingAggregates:
+    def __init__(self, path: str = RATINGS_DB_PATH):
+        self.path = path
+        self.local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def _conexion(self) -> sqlite3.Connection:
+        con = getattr(self.local, "con", None)
+        if con is None or self.local.pid != os.getpid():
+            con = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.executescript(ESQUEMA)
+            self.local.con = con
+            self.local.pid = os.getpid()
+        return con
+
+    @staticmethod
+    def _sumar(con, pelicula_id, mdb_id, titulo, consulta, dn: int, dsuma: float):
+        if pelicula_id:
+            con.execute(
+                """
+                INSERT INTO por_pelicula (pelicula_id, mdb_id, titulo, n, suma) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (pelicula_id) DO UPDATE SET
+                    n = n + excluded.n,
+                    suma = suma + excluded.suma,
+                    mdb_id = COALESCE(excluded.mdb_id, mdb_id),
+                    titulo = COALESCE(excluded.titulo, titulo)
+                """,
+                (pelicula_id, mdb_id, titulo, dn, dsuma),
+            )
+        if consulta:
+            con.execute(
+                """
+                INSERT INTO por_consulta (consulta, n, suma) VALUES (?, ?, ?)
+                ON CONFLICT (consulta) DO UPDATE SET n = n + excluded.n, suma = suma + excluded.suma
+                """,
+                (consulta, dn, dsuma),
+            )
+
+    # ---------------- Actualización ----------------
+    def record(self, detalle_id: str, pelicula_id: str, valor: float,
+               consulta: str | None = None, mdb_id: str | None = None, titulo: str | None = None):
+        """
+        Registra (o corrige) la evaluación de un detalle en O(1).
+        """
+        consulta = normalize_key(consulta) if consulta else None
+        con = self._conexion()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            previa = con.execute(
+                "SELECT pelicula_id, consulta, valor FROM evaluaciones WHERE detalle_id = ?", (detalle_id,)
+            ).fetchone()
+            if previa:
+                self._sumar(con, previa[0], None, None, previa[1], -1, -previa[2])
+            self._sumar(con, pelicula_id, mdb_id, titulo, consulta, 1, valor)
+            con.execute(
+                "INSERT OR REPLACE INTO evaluaciones (detalle_id, pelicula_id, consulta, valor) VALUES (?, ?, ?, ?)",
+                (detalle_id, pelicula_id, consulta, valor),
+            )
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+
+    def rebuild(self, evaluaciones: list[dict]) -> int:
+        """
+        Reemplaza todos los agregados. Cada elemento: detalle_id, pelicula_id,
+        valor y opcionalmente consulta, mdb_id y titulo.
+        """
+        con = self._conexion()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            con.execute("DELETE FROM por_pelicula")
+            con.execute("DELETE FROM por_consulta")
+            con.execute("DELETE FROM evaluaciones")
+            for e in evaluaciones:
+                consulta = normalize_key(e["consulta"]) if e.get("consulta") else None
+                self._sumar(con, e["pelicula_id"], e.get("mdb_id"), e.get("titulo"), consulta, 1, e["valor"])
+                con.execute(
+                    "INSERT OR REPLACE INTO evaluaciones (detalle_id, pelicula_id, consulta, valor) VALUES (?, ?, ?, ?)",
+                    (e["detalle_id"], e["pelicula_id"], consulta, e["valor"]),
+                )
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        return len(evaluaciones)
+
+    # ---------------- Consultas ----------------
+    def by_mdb_ids(self, mdb_ids: list[str]) -> dict:
+        """{mdb_id: (n, suma)} para las películas indicadas."""
+        if not mdb_ids:
+            return {}
+        marcas = ",".join("?" * len(mdb_ids))
+        filas = self._conexion().execute(
+            f"SELECT mdb_id, SUM(n), SUM(suma) FROM por_pelicula WHERE mdb_id IN ({marcas}) GROUP BY mdb_id",
+            [str(m) for m in mdb_ids],
+        ).fetchall()
+        return {mdb_id: (n, suma) for mdb_id, n, suma in filas if n}
+
+    def movie_stats(self, pelicula_id: str | None = None, limite: int = 10, min_evaluaciones: int = 1) -> list[dict]:
+        if pelicula_id:
+            filas = self._conexion().execute(
+                "SELECT pelicula_id, mdb_id, titulo, n, suma FROM por_pelicula WHERE pelicula_id = ?", (pelicula_id,)
+            ).fetchall()
+        else:
+            filas = self._conexion().execute(
+                """
+                SELECT pelicula_id, mdb_id, titulo, n, suma FROM por_pelicula
+                WHERE n >= ? ORDER BY suma / n DESC, n DESC LIMIT ?
+                """,
+                (max(min_evaluaciones, 1), limite),
+            ).fetchall()
+        return [
+            {
+                "peliculaId": pid,
+                "mdb_id": mdb_id,
+                "titulo": titulo,
+                "evaluaciones": n,
+                "promedio": round(suma / n, 2) if n else None,
+            }
+            for pid, mdb_id, titulo, n, suma in filas
+        ]
+
+    def query_stats(self, consulta: str | None = None, limite: int = 10) -> list[dict]:
+        if consulta:
+            filas = self._conexion().execute(
+                "SELECT consulta, n, suma FROM por_consulta WHERE consulta = ?", (normalize_key(consulta),)
+            ).fetchall()
+        else:
+            filas = self._conexion().execute(
+                "SELECT consulta, n, suma FROM por_consulta WHERE n > 0 ORDER BY n DESC LIMIT ?", (limite,)
+            ).fetchall()
+        return [
+            {"consulta": c, "evaluaciones": n, "promedio": round(suma / n, 2) if n else None}
+            for c, n, suma in filas
+        ]
+
+
+def rank_by_ratings(movies: list[dict], aggregates) -> list[dict]:
+    """
+    Re-ordena resultados de TMDB combinando su posición original con el
+    promedio bayesiano de evaluaciones de cada película (por mdb_id).
+    Sin evaluaciones, se conserva el orden de TMDB.
+    """
+    if not movies:
+        return movies
+    stats = aggregates.by_mdb_ids([str(m["id"]) for m in movies])
+    if not stats:
+        return movies
+
+    def puntaje(item):
+        pos, movie = item
+        n, suma = stats.get(str(movie["id"]), (0, 0.0))
+        relevancia = 1 - pos / len(movies)
+        rating = (bayesian_average(n, suma) - RATING_PRIOR) / 5 if n else 0.0
+        return relevancia + RATING_PESO * rating
+
+    return [m for _, m in sorted(enumerate(movies), key=puntaje, reverse=True)]
+
+
+def _todas(tabla: str, where: str | None, props: list[str]) -> list[dict]:
+    filas, offset = [], 0
+    while True:
+        params = {"pageSize": 100, "offset": offset, "sortBy": "created asc"}
+        if where:
+            params["where"] = where
+        pagina = backendless_get(tabla, params, props=props)
+        if not isinstance(pagina, list) or not pagina:
+            return filas
+        filas.extend(pagina)
+        offset += len(pagina)
+
+
+def rebuild_from_backendless(aggregates) -> int:
+    """Recalcula todos los agregados recorriendo las tablas una sola vez."""
+    detalles = _todas(
+        "detalleRecomendaciones", "evaluacion is not null",
+        ["objectId", "peliculaId", "recomendacionId", "evaluacion"],
+    )
+    consultas = {r["objectId"]: r.get("consulta") for r in _todas("recomendaciones", None, ["objectId", "consulta"])}
+    peliculas = {p["objectId"]: p for p in _todas("peliculas", None, ["objectId", "mdb_id", "titulo"])}
+
+    evaluaciones = []
+    for d in detalles:
+        pelicula = peliculas.get(d.get("peliculaId"), {})
+        evaluaciones.append({
+            "detalle_id": d["objectId"],
+            "pelicula_id": d.get("peliculaId"),
+            "valor": d["evaluacion"],
+            "consulta": consultas.get(d.get("recomendacionId")),
+            "mdb_id": pelicula.get("mdb_id"),
+            "titulo": pelicula.get("titulo"),
+        })
+    return aggregates.rebuild(evaluaciones)
+
+
+rating_aggregates = RatingAggregates()
+
+
+if __name__ == "__main__":
+    # Reconstruir los agregados desde Backendless: python -m services.ratings
+    print(f"{rebuild_from_backendless(rating_aggregates)} evaluaciones agregadas en {RATINGS_DB_PATH}")
@@ -1,13 +1,49 @@
+import contextvars
+import math
 import time
-import requests
 import os
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from urllib.parse import urlencode
 from dotenv import load_dotenv
-from .backendless_client import backendless_post, backendless_get
+from .backendless_client import backendless_get, backendless_patch, backendless_post
+from .cache import cache
+from .keyword_ids import keyword_ids
+from .text_normalization import normalize_key
+from .rate_limiter import tmdb_limiter
+from .resilience import DeadlineExceeded, current_deadline, upstream_request
+from .movie_index import movie_index
+from .ratings import rank_by_ratings, rating_aggregates
 
 load_dotenv()
 
 TMDB_API_KEY = os.getenv("TMDB_API_KEY")
 TMDB_BASE = "https://api.themoviedb.org/3"
+# Espera máxima en la cola de TMDB cuando la petición no tiene plazo propio
+TMDB_COLA_TIMEOUT = float(os.getenv("TMDB_COLA_TIMEOUT", "10"))
+TMDB_MAX_INTENTOS = 4
+TMDB_PAGE_SIZE = 20
+# Segundos que se reutilizan respuestas de TMDB y películas ya resueltas
+TMDB_CACHE_TTL = float(os.getenv("TMDB_CACHE_TTL", "600"))
+PELICULA_CACHE_TTL = float(os.getenv("PELICULA_CACHE_TTL", "3600"))
+
+# Reutilización de recomendaciones recientes para la misma consulta:
+#   REUSO_VENTANA: segundos durante los que se reutiliza (0 lo desactiva)
+#   REUSO_REGISTRO: qué se guarda al reutilizar
+#     "completo" -> cabecera + detalles (sin TMDB ni búsqueda de películas)
+#     "cabecera" -> solo la cabecera, con recomendacionOrigenId apuntando a
+#                   la recomendación cuyos detalles se reutilizan
+#     "ninguno"  -> nada; se devuelve la recomendación anterior
+REUSO_VENTANA = float(os.getenv("REUSO_VENTANA", "600"))
+REUSO_REGISTRO = os.getenv("REUSO_REGISTRO", "completo")
+reuso_stats = {"reutilizadas": 0, "nuevas": 0}
+TMDB_MAX_PAGINAS = 500
+
+# Páginas adicionales de TMDB se piden en paralelo
+_tmdb_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tmdb")
+# Las películas de una misma recomendación se guardan en Backendless en
+# paralelo, con hilos propios de cada petición (sus llamadas, buscar/crear
+# película y detalle, siguen en orden)
+BACKENDLESS_HILOS_POR_PETICION = int(os.getenv("BACKENDLESS_HILOS_POR_PETICION", "8"))
 
 def get_tmdb_params(extra: dict = None):
     base = {"api_key": TMDB_API_KEY, "language": "es-MX", "include_adult": "false"}
@@ -20,40 +56,120 @@ def get_tmdb_params(extra: dict = None):
 # ============ Funciones auxiliares TMDB ==============
 # =====================================================
 
-def search_tmdb_movies(query: str, max_results: int = 5):
-    """Busca películas en TMDB usando texto libre (query)."""
-    r = requests.get(f"{TMDB_BASE}/search/movie", params=get_tmdb_params({"query": query}))
+def tmdb_get(path: str, extra: dict = None):
+    """
+    GET a TMDB pasando por el limitador de tasa compartido.
+    Las respuestas 429 se reintentan (respetando Retry-After) mientras
+    quede plazo, en lugar de devolverse como error.
+    """
+    for intento in range(1, TMDB_MAX_INTENTOS + 1):
+        actual = current_deadline()
+        tmdb_limiter.acquire(actual.remaining() if actual else TMDB_COLA_TIMEOUT)
+        r = None
+        try:
+            r = upstream_request("tmdb", "GET", f"{TMDB_BASE}{path}", params=get_tmdb_params(extra))
+        finally:
+            tmdb_limiter.release(
+                r.status_code if r is not None else None,
+                r.headers.get("Retry-After") if r is not None else None,
+            )
+        if r.status_code != 429 or intento == TMDB_MAX_INTENTOS:
+            return r
+
+
+def tmdb_json(path: str, extra: dict = None, raise_errors: bool = False) -> dict:
+    """
+    Respuesta JSON de TMDB, guardada en la caché compartida.
+    Solo se guardan las respuestas 200.
+    """
+    clave = f"tmdb:{path}?{urlencode(sorted((extra or {}).items()))}"
+    data = cache.get(clave)
+    if data is not None:
+        return data
+
+    r = tmdb_get(path, extra)
+    if raise_errors:
+        r.raise_for_status()
     data = r.json()
-    if not data.get("results"):
-        return []
-    return data["results"][:max_results]
+    if r.status_code == 200:
+        cache.set(clave, data, TMDB_CACHE_TTL)
+    return data
 
 
-def search_tmdb_by_keyword(keyword: str, max_results: int = 5):
-    """Busca películas en TMDB por keyword (temática)."""
-    # Primero busca el ID de la keyword
-    r_kw = requests.get(f"{TMDB_BASE}/search/keyword", params=get_tmdb_params({"query": keyword}))
-    data_kw = r_kw.json()
+def tmdb_results(path: str, extra: dict = None, max_results: int = 5, raise_errors: bool = False):
+    """
+    Devuelve hasta max_results resultados de un endpoint paginado de TMDB.
+    La primera página indica el total; si hacen falta más de 20 resultados,
+    las páginas siguientes se piden en paralelo (con el mismo plazo).
+    """
+    def pagina(n: int) -> dict:
+        return tmdb_json(path, {**(extra or {}), "page": n}, raise_errors)
 
-    if not data_kw.get("results"):
-        return []
+    primera = pagina(1)
+    resultados = list(primera.get("results") or [])
+    paginas = min(primera.get("total_pages") or 1, TMDB_MAX_PAGINAS, math.ceil(max_results / TMDB_PAGE_SIZE))
 
-    keyword_id = data_kw["results"][0]["id"]
+    if len(resultados) < max_results and paginas > 1:
+        futuros = [
+            _tmdb_pool.submit(contextvars.copy_context().run, pagina, n)
+            for n in range(2, paginas + 1)
+        ]
+        for futuro in futuros:
+            resultados.extend(futuro.result().get("results") or [])
 
-    # Luego busca películas con esa keyword
-    r = requests.get(f"{TMDB_BASE}/discover/movie", params=get_tmdb_params({"with_keywords": keyword_id}))
-    data = r.json()
+    return resultados[:max_results]
 
-    if not data.get("results"):
+
+def search_tmdb_movies(query: str, max_results: int = 5):
+    """Busca películas en TMDB usando texto libre (query)."""
+    return tmdb_results("/search/movie", {"query": query}, max_results)
+
+
+def resolve_keyword(keyword: str):
+    """
+    Devuelve {"tipo": "genero" | "keyword", "id": int} para el término, o None
+    si TMDB no lo conoce. Usa el diccionario local y solo consulta
+    /search/keyword la primera vez que aparece un término (o cuando caducó
+    una respuesta sin resultados).
+    """
+    entrada = keyword_ids.get(keyword)
+    if entrada is None:
+        data_kw = tmdb_json("/search/keyword", {"query": keyword})
+        if "results" not in data_kw:
+            return None  # error de TMDB: no se guarda como término desconocido
+        resultados = data_kw["results"]
+        entrada = keyword_ids.put(keyword, resultados[0]["id"] if resultados else None)
+    return entrada if entrada.get("id") is not None else None
+
+
+def search_tmdb_by_keyword(keyword: str, max_results: int = 5):
+    """Busca películas en TMDB por keyword (temática) o género."""
+    entrada = resolve_keyword(keyword)
+    if not entrada:
         return []
 
-    return data["results"][:max_results]
+    filtro = "with_genres" if entrada["tipo"] == "genero" else "with_keywords"
+    return tmdb_results("/discover/movie", {filtro: entrada["id"]}, max_results)
+
+
+def remember_movie(pelicula):
+    """Registra una película de Backendless en la caché y en el índice local."""
+    if not isinstance(pelicula, dict) or not pelicula.get("mdb_id"):
+        return
+    cache.set(f"pelicula_mdb:{pelicula['mdb_id']}", pelicula, PELICULA_CACHE_TTL)
+    if not movie_index.contains(pelicula["mdb_id"]):
+        movie_index.add(pelicula)
 
 
 def find_movie_in_backendless(tmdb_id):
     """Busca si una película ya existe en Backendless usando el campo mdb_id."""
+    pelicula = cache.get(f"pelicula_mdb:{tmdb_id}")
+    if pelicula is not None:
+        return pelicula
+
     data = backendless_get("peliculas", f"mdb_id='{tmdb_id}'")
     if isinstance(data, list) and data:
+        remember_movie(data[0])
         return data[0]
     return None
 
@@ -71,7 +187,73 @@ def create_movie_in_backendless(movie):
         "fecha_estreno": movie.get("release_date", "") if movie.get("release_date") else None,
         "sinopsis": sinopsis
     }
-    return backendless_post("peliculas", payload)
+    pelicula = backendless_post("peliculas", payload)
+    remember_movie(pelicula)
+    return pelicula
+
+
+def en_paralelo(funcion, elementos):
+    """
+    Aplica funcion a cada elemento con un executor propio de esta llamada
+    (hasta BACKENDLESS_HILOS_POR_PETICION hilos, con el plazo de la petición
+    actual) y devuelve los resultados en orden, a medida que terminan.
+    Si se deja de consumir, cancela lo que no empezó.
+    """
+    elementos = list(elementos)
+    if not elementos:
+        return
+    executor = ThreadPoolExecutor(
+        max_workers=min(BACKENDLESS_HILOS_POR_PETICION, len(elementos)),
+        thread_name_prefix="backendless",
+    )
+    futuros = [
+        executor.submit(contextvars.copy_context().run, funcion, elemento)
+        for elemento in elementos
+    ]
+    try:
+        for futuro in futuros:
+            actual = current_deadline()
+            try:
+                yield futuro.result(timeout=None if actual is None else max(actual.remaining(), 0))
+            except FuturesTimeout:
+                raise DeadlineExceeded("Plazo agotado guardando la recomendación") from None
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def guardar_detalles(recomendacion: dict, funcion, elementos):
+    """
+    en_paralelo para los detalles de una recomendación ya creada con su
+    num_resultados final. Solo si no se guardan todos (plazo agotado, error
+    o cliente desconectado) corrige la cabecera con los que sí se emitieron.
+    """
+    elementos = list(elementos)
+    guardados = 0
+    try:
+        for detalle in en_paralelo(funcion, elementos):
+            guardados += 1
+            yield detalle
+    finally:
+        if guardados < len(elementos):
+            # Contexto nuevo: la corrección no depende del plazo ya agotado
+            contextvars.Context().run(_marcar_incompleta, recomendacion, guardados)
+
+
+def _marcar_incompleta(recomendacion: dict, guardados: int):
+    try:
+        backendless_patch("recomendaciones", recomendacion.get("objectId"), {
+            "num_resultados": guardados,
+            "mensaje_resultado": "Incompleta",
+        })
+    except Exception as e:
+        print(f"No se pudo corregir la recomendación {recomendacion.get('objectId')}: {e}")
+
+
+def resultado_final(eventos):
+    """Consume los eventos de un generador iter_* y devuelve el resumen final."""
+    for evento, datos in eventos:
+        if evento == "resumen":
+            return datos
 
 
 # =====================================================
@@ -82,10 +264,33 @@ def create_recommendation(consulta: str, tipo_busqueda: str = "texto", max_resul
     Crea una recomendación completa en Backendless con base en TMDB.
     tipo_busqueda: "texto" o "keyword"
     """
+    return resultado_final(iter_create_recommendation(consulta, tipo_busqueda, max_results))
+
+
+def iter_create_recommendation(consulta: str, tipo_busqueda: str = "texto", max_results: int = 5):
+    """
+    Igual que create_recommendation, pero genera eventos (evento, datos):
+    un "detalle" por cada película en cuanto queda guardada y al final
+    un "resumen" con la respuesta completa.
+    Si la misma consulta se resolvió hace menos de REUSO_VENTANA segundos,
+    reutiliza esa lista de películas.
+    """
+    clave_reuso = f"recomendacion:{tipo_busqueda}:{max_results}:{normalize_key(consulta)}"
+    anterior = cache.get(clave_reuso) if REUSO_VENTANA > 0 else None
+    if anterior:
+        reuso_stats["reutilizadas"] += 1
+        yield from iter_reused_recommendation(consulta, anterior)
+        return
+    reuso_stats["nuevas"] += 1
+
+    # Se piden al menos una página completa de candidatos (no cuesta llamadas
+    # extra) y se re-ordenan según las evaluaciones previas de cada película
+    candidatos = max(max_results, TMDB_PAGE_SIZE)
     if tipo_busqueda == "keyword":
-        movies = search_tmdb_by_keyword(consulta, max_results)
+        movies = search_tmdb_by_keyword(consulta, candidatos)
     else:
-        movies = search_tmdb_movies(consulta, max_results)
+        movies = search_tmdb_movies(consulta, candidatos)
+    movies = rank_by_ratings(movies, rating_aggregates)[:max_results]
 
     timestamp = int(time.time() * 1000)
 
@@ -99,11 +304,12 @@ def create_recommendation(consulta: str, tipo_busqueda: str = "texto", max_resul
             "mensaje_resultado": "No se encontraron resultados"
         }
         recomendacion = backendless_post("recomendaciones", payload)
-        return {
+        yield "resumen", {
             "mensaje": "Sin resultados",
             "recomendacion": recomendacion,
             "detalles": []
         }
+        return
 
     # Crear recomendación principal
     rec_payload = {
@@ -117,8 +323,8 @@ def create_recommendation(consulta: str, tipo_busqueda: str = "texto", max_resul
     rec_id = recomendacion.get("objectId")
 
     # Crear detalles con información completa de película
-    detalles = []
-    for idx, movie in enumerate(movies, start=1):
+    def guardar(item):
+        idx, movie = item
         tmdb_id = str(movie["id"])
 
         # Buscar o crear la película en Backendless
@@ -150,11 +356,74 @@ def create_recommendation(consulta: str, tipo_busqueda: str = "texto", max_resul
             "orden": detalle_payload["orden"],
             "fecha_creacion": detalle_payload["fecha_creacion"]
         }
+        return detalle_info
 
+    detalles = []
+    for detalle_info in guardar_detalles(recomendacion, guardar, enumerate(movies, start=1)):
         detalles.append(detalle_info)
+        yield "detalle", detalle_info
+
+    if REUSO_VENTANA > 0:
+        cache.set(clave_reuso, {"recomendacion": recomendacion, "detalles": detalles}, REUSO_VENTANA)
 
     # Respuesta completa con estructura deseada
-    return {
+    yield "resumen", {
+        "mensaje": "Recomendación creada correctamente",
+        "recomendacion": recomendacion,
+        "detalles": detalles
+    }
+
+
+def iter_reused_recommendation(consulta: str, anterior: dict):
+    """
+    Devuelve la lista de películas de una recomendación reciente para la
+    misma consulta, guardando solo lo indicado en REUSO_REGISTRO.
+    """
+    detalles_previos = anterior["detalles"]
+    if REUSO_REGISTRO == "ninguno":
+        for detalle_info in detalles_previos:
+            yield "detalle", detalle_info
+        yield "resumen", {
+            "mensaje": "Recomendación reutilizada",
+            "recomendacion": anterior["recomendacion"],
+            "detalles": detalles_previos
+        }
+        return
+
+    timestamp = int(time.time() * 1000)
+    rec_payload = {
+        "consulta": consulta,
+        "fuente_datos": "Reutilizada",
+        "num_resultados": len(detalles_previos),
+        "fecha_creacion": timestamp,
+        "mensaje_resultado": "Búsqueda exitosa"
+    }
+    if REUSO_REGISTRO == "cabecera":
+        # Sin detalles propios: las películas (y sus evaluaciones) son las de la original
+        rec_payload["recomendacionOrigenId"] = anterior["recomendacion"].get("objectId")
+        recomendacion = backendless_post("recomendaciones", rec_payload)
+        detalles = [{**previo, "fecha_creacion": timestamp} for previo in detalles_previos]
+        for detalle_info in detalles:
+            yield "detalle", detalle_info
+    else:
+        recomendacion = backendless_post("recomendaciones", rec_payload)
+
+        def guardar(previo):
+            backendless_post("detalleRecomendaciones", {
+                "recomendacionId": recomendacion.get("objectId"),
+                "peliculaId": previo["pelicula"].get("objectId"),
+                "razon_recomendacion": previo["razon_recomendacion"],
+                "orden": previo["orden"],
+                "fecha_creacion": timestamp
+            })
+            return {**previo, "fecha_creacion": timestamp}
+
+        detalles = []
+        for detalle_info in guardar_detalles(recomendacion, guardar, detalles_previos):
+            detalles.append(detalle_info)
+            yield "detalle", detalle_info
+
+    yield "resumen", {
         "mensaje": "Recomendación creada correctamente",
         "recomendacion": recomendacion,
         "detalles": detalles
@@ -166,30 +435,36 @@ def create_recommendation(consulta: str, tipo_busqueda: str = "texto", max_resul
 # =====================================================
 def get_similar_movies(titulo: str, max_results: int = 5):
     """
-    Busca una película por título en TMDB y devuelve otras similares.
+    Busca una película por título y devuelve otras similares.
+    Primero intenta con el índice vectorial local; si no hay
+    suficientes vecinos, consulta TMDB.
     """
+    return resultado_final(iter_similar_movies(titulo, max_results))
+
+
+def iter_similar_movies(titulo: str, max_results: int = 5):
+    """Versión por eventos de get_similar_movies (ver iter_create_recommendation)."""
+    vecinos = find_local_neighbours(titulo, max_results)
+    if vecinos:
+        yield from iter_similar_movies_local(titulo, vecinos)
+        return
+
     # Paso 1: Buscar ID de la película base
-    search_url = f"{TMDB_BASE}/search/movie"
-    r = requests.get(search_url, params=get_tmdb_params({"page": 1, "query": titulo}))
-    r.raise_for_status()
-    data = r.json()
+    data = tmdb_json("/search/movie", {"page": 1, "query": titulo}, raise_errors=True)
 
     if not data.get("results"):
-        return {"mensaje": f"No encontré películas similares a '{titulo}'.", "detalles": []}
+        yield "resumen", {"mensaje": f"No encontré películas similares a '{titulo}'.", "detalles": []}
+        return
 
     base_movie = data["results"][0]
     base_id = base_movie["id"]
 
     # Paso 2: Obtener similares
-    sim_url = f"{TMDB_BASE}/movie/{base_id}/similar"
-    r2 = requests.get(sim_url, params=get_tmdb_params({"page": 1}))
-    r2.raise_for_status()
-    sim_data = r2.json()
-
-    results = sim_data.get("results", [])[:max_results]
+    results = tmdb_results(f"/movie/{base_id}/similar", None, max_results, raise_errors=True)
 
     if not results:
-        return {"mensaje": f"No se encontraron películas similares a '{titulo}'.", "detalles": []}
+        yield "resumen", {"mensaje": f"No se encontraron películas similares a '{titulo}'.", "detalles": []}
+        return
 
     # Paso 3: Estructurar resultado
     timestamp = int(time.time() * 1000)
@@ -202,8 +477,8 @@ def get_similar_movies(titulo: str, max_results: int = 5):
     }
     recomendacion = backendless_post("recomendaciones", rec_payload)
 
-    detalles = []
-    for idx, movie in enumerate(results, start=1):
+    def guardar(item):
+        idx, movie = item
         sinopsis = (movie.get("overview") or "").strip()[:250]
         peli_payload = {
             "mdb_id": str(movie.get("id")),
@@ -213,6 +488,7 @@ def get_similar_movies(titulo: str, max_results: int = 5):
         }
 
         peli = backendless_post("peliculas", peli_payload)
+        remember_movie(peli)
         detalle = {
             "recomendacionId": recomendacion.get("objectId"),
             "peliculaId": peli.get("objectId"),
@@ -222,9 +498,66 @@ def get_similar_movies(titulo: str, max_results: int = 5):
         }
         backendless_post("detalleRecomendaciones", detalle)
         detalle["pelicula"] = peli
+        return detalle
+
+    detalles = []
+    for detalle in guardar_detalles(recomendacion, guardar, enumerate(results, start=1)):
         detalles.append(detalle)
+        yield "detalle", detalle
 
-    return {
+    yield "resumen", {
+        "mensaje": f"Películas similares a '{titulo}' encontradas",
+        "recomendacion": recomendacion,
+        "detalles": detalles,
+    }
+
+
+def find_local_neighbours(titulo: str, max_results: int = 5):
+    """
+    Busca vecinos de la película en el índice local (sin llamar a TMDB).
+    Devuelve None si la película base no está indexada o si no hay
+    max_results vecinos por encima del umbral de similitud.
+    """
+    base = movie_index.find_by_title(titulo)
+    if not base:
+        return None
+    vecinos = movie_index.similar(base["mdb_id"], max_results)
+    if len(vecinos) < max_results:
+        return None
+    return vecinos
+
+
+def iter_similar_movies_local(titulo: str, vecinos: list):
+    """Guarda la recomendación con los vecinos locales, emitiendo eventos."""
+    timestamp = int(time.time() * 1000)
+    rec_payload = {
+        "consulta": f"Similares a {titulo}",
+        "fuente_datos": "Local",
+        "num_resultados": len(vecinos),
+        "fecha_creacion": timestamp,
+        "mensaje_resultado": f"Películas similares a '{titulo}'",
+    }
+    recomendacion = backendless_post("recomendaciones", rec_payload)
+
+    def guardar(item):
+        idx, (peli, _sim) = item
+        detalle = {
+            "recomendacionId": recomendacion.get("objectId"),
+            "peliculaId": peli.get("objectId"),
+            "razon_recomendacion": f"Similar a '{titulo}'",
+            "orden": idx,
+            "fecha_creacion": timestamp,
+        }
+        backendless_post("detalleRecomendaciones", detalle)
+        detalle["pelicula"] = dict(peli)
+        return detalle
+
+    detalles = []
+    for detalle in guardar_detalles(recomendacion, guardar, enumerate(vecinos, start=1)):
+        detalles.append(detalle)
+        yield "detalle", detalle
+
+    yield "resumen", {
         "mensaje": f"Películas similares a '{titulo}' encontradas",
         "recomendacion": recomendacion,
         "detalles": detalles,
@@ -239,20 +572,22 @@ def get_trending_movies(tipo: str = "popular", max_results: int = 5):
     Devuelve películas populares o estrenos recientes desde TMDB.
     tipo = "popular" o "estrenos"
     """
+    return resultado_final(iter_trending_movies(tipo, max_results))
+
+
+def iter_trending_movies(tipo: str = "popular", max_results: int = 5):
+    """Versión por eventos de get_trending_movies (ver iter_create_recommendation)."""
     if tipo == "estrenos":
-        endpoint = f"{TMDB_BASE}/movie/now_playing"
+        endpoint = "/movie/now_playing"
         titulo_rec = "Estrenos recientes"
     else:
-        endpoint = f"{TMDB_BASE}/trending/movie/day"
+        endpoint = "/trending/movie/day"
         titulo_rec = "Películas populares"
 
-    r = requests.get(endpoint, params=get_tmdb_params({"page": 1}))
-    r.raise_for_status()
-    data = r.json()
-
-    results = data.get("results", [])[:max_results]
+    results = tmdb_results(endpoint, None, max_results, raise_errors=True)
     if not results:
-        return {"mensaje": f"No se encontraron {titulo_rec.lower()}.", "detalles": []}
+        yield "resumen", {"mensaje": f"No se encontraron {titulo_rec.lower()}.", "detalles": []}
+        return
 
     # Crear registro principal
     timestamp = int(time.time() * 1000)
@@ -265,8 +600,8 @@ def get_trending_movies(tipo: str = "popular", max_results: int = 5):
     }
     recomendacion = backendless_post("recomendaciones", rec_payload)
 
-    detalles = []
-    for idx, movie in enumerate(results, start=1):
+    def guardar(item):
+        idx, movie = item
         sinopsis = (movie.get("overview") or "").strip()[:250]
         peli_payload = {
             "mdb_id": str(movie.get("id")),
@@ -275,6 +610,7 @@ def get_trending_movies(tipo: str = "popular", max_results: int = 5):
             "sinopsis": sinopsis,
         }
         peli = backendless_post("peliculas", peli_payload)
+        remember_movie(peli)
         detalle = {
             "recomendacionId": recomendacion.get("objectId"),
             "peliculaId": peli.get("objectId"),
@@ -284,9 +620,14 @@ def get_trending_movies(tipo: str = "popular", max_results: int = 5):
         }
         backendless_post("detalleRecomendaciones", detalle)
         detalle["pelicula"] = peli
+        return detalle
+
+    detalles = []
+    for detalle in guardar_detalles(recomendacion, guardar, enumerate(results, start=1)):
         detalles.append(detalle)
+        yield "detalle", detalle
 
-    return {
+    yield "resumen", {
         "mensaje": f"{titulo_rec} encontradas",
         "recomendacion": recomendacion,
         "detalles": detalles,
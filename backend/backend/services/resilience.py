@@ -0,0 +1,298 @@
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+
+import requests
+from urllib3.exceptions import DecodeError, ProtocolError, ReadTimeoutError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# =====================================================
+# ====== Llamadas salientes con plazo y breakers ======
+# =====================================================
+# Toda llamada HTTP a Backendless o TMDB pasa por upstream_request(), que:
+#   - limita el timeout al tiempo restante del plazo de la petición actual
+#     y corta la recepción del cuerpo si el plazo se agota,
+#   - falla rápido si el circuit breaker de ese upstream está abierto,
+#   - opcionalmente duplica (hedge) los GET idempotentes lentos.
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+GATEWAY_DEADLINE = float(os.getenv("GATEWAY_DEADLINE", "20"))
+# Segundos a esperar antes de lanzar la segunda copia de un GET; 0 lo desactiva
+HEDGE_DELAY = float(os.getenv("HEDGE_DELAY", "0.5"))
+BREAKER_FALLOS = int(os.getenv("BREAKER_FALLOS", "5"))
+BREAKER_ESPERA = float(os.getenv("BREAKER_ESPERA", "30"))
+
+
+class DeadlineExceeded(Exception):
+    """Se agotó el plazo de la petición antes de completar la llamada."""
+
+
+class UpstreamUnavailable(Exception):
+    """El circuit breaker del upstream está abierto."""
+
+
+# ---------------- Plazos ----------------
+_deadline = ContextVar("deadline", default=None)
+
+
+class Deadline:
+    def __init__(self, segundos: float):
+        self.expira = time.monotonic() + segundos
+
+    def remaining(self) -> float:
+        return self.expira - time.monotonic()
+
+    @contextmanager
+    def activate(self):
+        """Hace que este plazo aplique a las llamadas del contexto actual."""
+        token = _deadline.set(self)
+        try:
+            yield self
+        finally:
+            _deadline.reset(token)
+
+
+def deadline(segundos: float = GATEWAY_DEADLINE):
+    """
+    Uso: with deadline(5): ...
+    Todas las llamadas salientes dentro del bloque comparten el plazo.
+    """
+    return Deadline(segundos).activate()
+
+
+def current_deadline() -> Deadline | None:
+    return _deadline.get()
+
+
+def request_timeout() -> tuple[float, float]:
+    """Timeout (conexión, lectura) acotado por el plazo vigente."""
+    actual = _deadline.get()
+    if actual is None:
+        return HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT
+    restante = actual.remaining()
+    if restante <= 0:
+        raise DeadlineExceeded("Plazo agotado antes de la llamada")
+    return min(HTTP_CONNECT_TIMEOUT, restante), min(HTTP_READ_TIMEOUT, restante)
+
+
+# ---------------- Circuit breaker ----------------
+class CircuitBreaker:
+    def __init__(self, nombre: str, max_fallos: int = BREAKER_FALLOS, espera: float = BREAKER_ESPERA):
+        self.nombre = nombre
+        self.max_fallos = max_fallos
+        self.espera = espera
+        self.estado = "cerrado"    # cerrado | abierto | semiabierto
+        self.fallos = 0            # fallos consecutivos
+        self.abierto_desde = 0.0
+        self.probando = False
+        self.lock = threading.Lock()
+        self.contadores = {"exitos": 0, "fallos": 0, "rechazos": 0, "aperturas": 0}
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.estado == "abierto" and time.monotonic() - self.abierto_desde >= self.espera:
+                self.estado = "semiabierto"
+                self.probando = False
+            if self.estado == "cerrado":
+                return True
+            if self.estado == "semiabierto" and not self.probando:
+                # Solo una llamada de prueba a la vez
+                self.probando = True
+                return True
+            self.contadores["rechazos"] += 1
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.contadores["exitos"] += 1
+            self.fallos = 0
+            self.estado = "cerrado"
+            self.probando = False
+
+    def record_ignored(self):
+        """La llamada terminó sin decir nada del upstream (p. ej. plazo propio agotado)."""
+        with self.lock:
+            self.probando = False
+
+    def record_failure(self):
+        with self.lock:
+            self.contadores["fallos"] += 1
+            self.fallos += 1
+            self.probando = False
+            if self.estado == "semiabierto" or self.fallos >= self.max_fallos:
+                if self.estado != "abierto":
+                    self.contadores["aperturas"] += 1
+                self.estado = "abierto"
+                self.abierto_desde = time.monotonic()
+
+    def status(self) -> dict:
+        with self.lock:
+            return {"estado": self.estado, "fallos_consecutivos": self.fallos, **self.contadores}
+
+
+breakers = {
+    "backendless": CircuitBreaker("backendless"),
+    "tmdb": CircuitBreaker("tmdb"),
+}
+
+hedge_stats = {"lanzados": 0, "ganados": 0, "omitidos": 0}
+_hedge_lock = threading.Lock()
+# Hilos para GET con hedge; cada intento toma un cupo y, si no hay, el GET
+# se hace en el hilo que llama y sin segunda copia (nunca se encola)
+HEDGE_MAX = int(os.getenv("HEDGE_MAX", "16"))
+_hedge_pool = ThreadPoolExecutor(max_workers=HEDGE_MAX, thread_name_prefix="hedge")
+_hedge_cupos = threading.BoundedSemaphore(HEDGE_MAX)
+# Bytes por lectura al recibir el cuerpo bajo un plazo
+BLOQUE_LECTURA = 16 * 1024
+
+
+# ---------------- Llamadas HTTP ----------------
+def _solicitar(method: str, url: str, timeout, **kwargs) -> requests.Response:
+    """
+    requests.request que, con un plazo vigente, recibe el cuerpo por partes
+    y corta en cuanto el plazo se agota: los timeouts de socket solo acotan
+    cada lectura, no una respuesta que llega de a poco.
+    """
+    actual = _deadline.get()
+    if actual is None:
+        return requests.request(method, url, timeout=timeout, **kwargs)
+
+    r = requests.request(method, url, timeout=timeout, stream=True, **kwargs)
+    try:
+        partes = []
+        while True:
+            if actual.remaining() <= 0:
+                raise DeadlineExceeded(f"Plazo agotado recibiendo {url}")
+            try:
+                # read1 devuelve lo que llegó (hasta BLOQUE_LECTURA) sin esperar a llenar el bloque
+                parte = r.raw.read1(BLOQUE_LECTURA, decode_content=True)
+            except ReadTimeoutError as e:
+                raise requests.ReadTimeout(e, request=r.request, response=r) from e
+            except (ProtocolError, DecodeError) as e:
+                raise requests.ConnectionError(e, request=r.request, response=r) from e
+            if not parte:
+                break
+            partes.append(parte)
+    finally:
+        r.close()
+    r._content = b"".join(partes)
+    return r
+
+
+def _lanzar(url: str, timeout, **kwargs) -> Future | None:
+    """Lanza el GET en _hedge_pool si hay cupo libre; si no, devuelve None."""
+    if not _hedge_cupos.acquire(blocking=False):
+        return None
+
+    def ejecutar():
+        try:
+            return _solicitar("GET", url, timeout, **kwargs)
+        finally:
+            _hedge_cupos.release()
+
+    return _hedge_pool.submit(copy_context().run, ejecutar)
+
+
+def _plazo_restante() -> float | None:
+    actual = _deadline.get()
+    return None if actual is None else max(actual.remaining(), 0.0)
+
+
+def _hedged_get(url: str, timeout, **kwargs) -> requests.Response:
+    """
+    Lanza el GET; si no respondió tras HEDGE_DELAY (y hay cupo), lanza una
+    segunda copia y devuelve la primera respuesta exitosa. Las esperas
+    quedan acotadas por el plazo vigente.
+    """
+    primera = _lanzar(url, timeout, **kwargs)
+    if primera is None:
+        # Sin hilos libres: GET normal en este hilo, sin hedge
+        with _hedge_lock:
+            hedge_stats["omitidos"] += 1
+        return _solicitar("GET", url, timeout, **kwargs)
+
+    restante = _plazo_restante()
+    espera = HEDGE_DELAY if restante is None else min(HEDGE_DELAY, restante)
+    hecho, _ = wait([primera], timeout=espera)
+    if hecho:
+        return primera.result()
+
+    pendientes = {primera}
+    segunda = _lanzar(url, timeout, **kwargs)
+    with _hedge_lock:
+        hedge_stats["lanzados" if segunda else "omitidos"] += 1
+    if segunda is not None:
+        pendientes.add(segunda)
+
+    error = None
+    while pendientes:
+        hechos, pendientes = wait(pendientes, timeout=_plazo_restante(), return_when=FIRST_COMPLETED)
+        if not hechos:
+            raise DeadlineExceeded(f"Plazo agotado esperando {url}")
+        for futuro in hechos:
+            if futuro.exception() is None:
+                if futuro is segunda:
+                    with _hedge_lock:
+                        hedge_stats["ganados"] += 1
+                return futuro.result()
+            error = futuro.exception()
+    raise error
+
+
+def _acotado_por_plazo(error: requests.RequestException, timeout: tuple[float, float]) -> bool:
+    """True si el error es un timeout que solo ocurrió por el recorte del plazo."""
+    if isinstance(error, requests.ConnectTimeout):
+        return timeout[0] < HTTP_CONNECT_TIMEOUT
+    if isinstance(error, requests.Timeout):
+        return timeout[1] < HTTP_READ_TIMEOUT
+    return False
+
+
+def upstream_request(upstream: str, method: str, url: str, hedge: bool = False, **kwargs) -> requests.Response:
+    """
+    Ejecuta una llamada HTTP contra 'upstream' respetando el plazo vigente
+    y el circuit breaker. Con hedge=True (solo GET idempotentes) puede
+    lanzar una segunda copia si la primera tarda.
+    """
+    timeout = request_timeout()
+    breaker = breakers[upstream]
+    if not breaker.allow():
+        raise UpstreamUnavailable(f"{upstream} no disponible (circuit breaker abierto)")
+
+    try:
+        if hedge and method == "GET" and HEDGE_DELAY > 0:
+            r = _hedged_get(url, timeout, **kwargs)
+        else:
+            r = _solicitar(method, url, timeout, **kwargs)
+    except DeadlineExceeded:
+        breaker.record_ignored()
+        raise
+    except requests.RequestException as e:
+        if _acotado_por_plazo(e, timeout):
+            # El timeout lo recortó el plazo de la petición, no es culpa del upstream
+            breaker.record_ignored()
+        else:
+            breaker.record_failure()
+        actual = _deadline.get()
+        if actual is not None and actual.remaining() <= 0:
+            raise DeadlineExceeded(f"Plazo agotado llamando a {upstream}") from e
+        raise
+
+    if r.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return r
+
+
+def metrics() -> dict:
+    return {
+        "breakers": {nombre: b.status() for nombre, b in breakers.items()},
+        "hedge": dict(hedge_stats),
+    }
@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from .backendless_client import CAMPOS_PELICULA, backendless_get
+
+load_dotenv()
+
+# =====================================================
+# ====== Sincronización incremental de Backendless =====
+# =====================================================
+# Mantiene una copia local de tablas de Backendless. Cada ciclo pide solo
+# las filas creadas o actualizadas desde la última marca (high-water mark)
+# y las aplica por objectId. La resincronización completa es bajo demanda.
+
+# Desactivada por defecto: cada proceso que la active descarga las tablas y
+# sondea Backendless por su cuenta. Con varios workers conviene activarla
+# en un solo despliegue de un worker (o no usarla).
+SYNC_ENABLED = os.getenv("SYNC_ENABLED", "false").lower() == "true"
+SYNC_INTERVAL = float(os.getenv("SYNC_INTERVAL", "3"))
+SYNC_PAGE_SIZE = 100
+# Margen (ms) que se vuelve a pedir antes de la marca, por si llegan
+# filas con el mismo timestamp o ligeramente desordenadas.
+SYNC_OVERLAP_MS = 2000
+
+
+def _marca(fila: dict) -> int:
+    """
+    Timestamp más reciente de la fila según el servidor (updated o created),
+    las mismas columnas que usa el filtro where. fecha_creacion no cuenta:
+    la pone el reloj de la app y podría adelantar la marca.
+    """
+    valores = [fila.get(c) for c in ("updated", "created")]
+    return max((v for v in valores if isinstance(v, (int, float))), default=0)
+
+
+class SyncedTable:
+    def __init__(self, tabla: str, props: list[str] | None = None):
+        self.tabla = tabla
+        self.props = props
+        self.filas = {}          # objectId -> fila
+        self.marca = 0           # high-water mark en ms
+        self.lock = threading.Lock()
+        self.listo = False
+        self.ultima_sync = None  # inicio (epoch s) del último ciclo exitoso
+        self.ultimo_error = None
+
+    def _descargar(self, desde: int) -> list[dict]:
+        """Descarga, paginando, las filas con marca >= desde."""
+        params = {"sortBy": "created asc", "pageSize": SYNC_PAGE_SIZE}
+        if desde > 0:
+            params["where"] = f"created >= {desde} OR updated >= {desde}"
+
+        filas, offset = [], 0
+        while True:
+            pagina = backendless_get(self.tabla, {**params, "offset": offset}, props=self.props)
+            if not isinstance(pagina, list):
+                raise RuntimeError(f"Respuesta inesperada al sincronizar {self.tabla}")
+            filas.extend(pagina)
+            if len(pagina) < SYNC_PAGE_SIZE:
+                return filas
+            offset += len(pagina)
+
+    def sync(self) -> int:
+        """Aplica los cambios nuevos; devuelve cuántas filas llegaron."""
+        inicio = time.time()
+        desde = max(self.marca - SYNC_OVERLAP_MS, 0) if self.listo else 0
+        try:
+            nuevas = self._descargar(desde)
+        except Exception as e:
+            self.ultimo_error = str(e)
+            raise
+
+        with self.lock:
+            for fila in nuevas:
+                self.filas[fila["objectId"]] = fila
+                self.marca = max(self.marca, _marca(fila))
+            self.listo = True
+            self.ultima_sync = inicio
+            self.ultimo_error = None
+        return len(nuevas)
+
+    def resync(self) -> int:
+        """Descarga la tabla completa y reemplaza la copia local."""
+        inicio = time.time()
+        filas = self._descargar(0)
+        with self.lock:
+            self.filas = {f["objectId"]: f for f in filas}
+            self.marca = max((_marca(f) for f in filas), default=0)
+            self.listo = True
+            self.ultima_sync = inicio
+            self.ultimo_error = None
+        return len(filas)
+
+    def rows(self) -> list[dict]:
+        with self.lock:
+            return sorted(self.filas.values(), key=lambda f: f.get("created") or 0)
+
+    def get(self, object_id: str):
+        with self.lock:
+            return self.filas.get(object_id)
+
+    def status(self) -> dict:
+        lag = round(time.time() - self.ultima_sync, 2) if self.ultima_sync else None
+        return {
+            "listo": self.listo,
+            "filas": len(self.filas),
+            "marca": self.marca,
+            "lag_segundos": lag,
+            "ultimo_error": self.ultimo_error,
+        }
+
+
+class BackendlessSync:
+    def __init__(self, tablas: dict[str, list[str] | None], intervalo: float = SYNC_INTERVAL):
+        self.tablas = {nombre: SyncedTable(nombre, props) for nombre, props in tablas.items()}
+        self.intervalo = intervalo
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def _ciclo(self):
+        while not self._detener.is_set():
+            for tabla in self.tablas.values():
+                try:
+                    tabla.sync()
+                except Exception as e:
+                    print(f"Error sincronizando {tabla.tabla}: {e}")
+            self._detener.wait(self.intervalo)
+
+    def start(self):
+        if self._hilo and self._hilo.is_alive():
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._ciclo, name="backendless-sync", daemon=True)
+        self._hilo.start()
+
+    def stop(self):
+        self._detener.set()
+
+    def resync(self) -> dict:
+        return {nombre: tabla.resync() for nombre, tabla in self.tablas.items()}
+
+    def table(self, nombre: str):
+        """Devuelve la tabla local si ya está sincronizada; si no, None."""
+        tabla = self.tablas.get(nombre)
+        return tabla if tabla and tabla.listo else None
+
+    def status(self) -> dict:
+        return {nombre: tabla.status() for nombre, tabla in self.tablas.items()}
+
+
+sincronizador = BackendlessSync({
+    "detalleRecomendaciones": None,
+    "peliculas": [*CAMPOS_PELICULA, "created", "updated"],
+})
@@ -0,0 +1,84 @@
+import codecs
+import unicodedata
+from functools import lru_cache
+
+# =====================================================
+# ============== Normalización de texto ===============
+# =====================================================
+# Quita acentos y pasa a minúsculas. Produce exactamente lo mismo que
+#     unicodedata.normalize("NFD", t).encode("ascii", "ignore").decode("utf-8").lower()
+# pero el caso común (español: todo en Latin-1) se resuelve con una tabla
+# precalculada de 256 bytes y bytes.translate, sin descomponer la cadena.
+
+SEPARADOR = "\x00"
+
+
+def normalize_text_reference(texto: str) -> str:
+    """Implementación original (referencia para la tabla y los benchmarks)."""
+    return (
+        unicodedata.normalize("NFD", texto)
+        .encode("ascii", "ignore")
+        .decode("utf-8")
+        .lower()
+    )
+
+
+# La descomposición NFD de una cadena es la concatenación de la de cada
+# carácter (el reordenamiento canónico solo mueve marcas combinantes, que
+# no son ASCII y se descartan), así que basta con traducir carácter a carácter.
+# En Latin-1 cada carácter queda en un solo byte ASCII o desaparece.
+TABLA_LATIN1 = bytes(
+    ord(normalize_text_reference(chr(b)) or "\x00") for b in range(256)
+)
+BORRAR_LATIN1 = bytes(b for b in range(256) if not normalize_text_reference(chr(b)))
+
+
+def _fuera_de_latin1(error: UnicodeEncodeError):
+    # Caracteres sin byte Latin-1 (comillas tipográficas, guiones largos...):
+    # se resuelven con el método original y continúan ya como ASCII
+    return normalize_text_reference(error.object[error.start:error.end]), error.end
+
+
+codecs.register_error("normalizacion", _fuera_de_latin1)
+
+
+def normalize_text_uncached(texto: str | None) -> str:
+    """
+    Igual que normalize_text pero sin caché: para textos que casi nunca se
+    repiten (mensajes del usuario), que solo ocuparían lugar en la LRU.
+    """
+    texto = texto or ""
+    if texto.isascii():
+        return texto.lower()
+    return (
+        texto.encode("latin-1", "normalizacion")
+        .translate(TABLA_LATIN1, BORRAR_LATIN1)
+        .decode("ascii")
+    )
+
+
+# Solo para valores que se repiten mucho (títulos, términos, claves)
+@lru_cache(maxsize=4096)
+def normalize_text(texto: str | None) -> str:
+    """Texto sin acentos y en minúsculas ("" si es None)."""
+    return normalize_text_uncached(texto)
+
+
+def normalize_key(texto: str | None) -> str:
+    """normalize_text con los espacios colapsados; para usar como clave."""
+    return " ".join(normalize_text(texto).split())
+
+
+def normalize_many(textos: list[str | None]) -> list[str]:
+    """
+    Normaliza una lista de cadenas en una sola pasada (une, traduce y
+    vuelve a separar), sin pasar por la caché de cadenas sueltas.
+    """
+    textos = [t or "" for t in textos]
+    if not textos:
+        return []
+    unido = SEPARADOR.join(textos)
+    if unido.count(SEPARADOR) != len(textos) - 1:
+        # Alguna cadena contiene el separador
+        return [normalize_text_uncached(t) for t in textos]
+    return normalize_text_uncached(unido).split(SEPARADOR)
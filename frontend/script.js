@@ -34,142 +34,220 @@ function appendMessage(text, sender) {
 }
 
 
+function removeMessage(messageDiv) {
+  const chatHistory = document.getElementById('chat-history');
+  if (messageDiv && chatHistory.contains(messageDiv)) {
+    chatHistory.removeChild(messageDiv);
+  }
+}
+
+
+// Genera la fila de la tabla para un detalle de recomendación.
+function detalleRowHTML(d, i) {
+  const titulo = d.pelicula?.titulo ?? '(sin título)';
+  const razon = d.razon_recomendacion ?? '';
+  const evalNum = typeof d.evaluacion === 'number' ? d.evaluacion : null;
+
+  // Generar estrellas
+  let estrellasHTML = '';
+  if (evalNum !== null) {
+    const maxStars = 5;
+    for (let s = 1; s <= maxStars; s++) {
+      estrellasHTML += s <= evalNum
+        ? '<span style="color: gold; font-size: 1.2em;">★</span>'
+        : '<span style="color: #ccc; font-size: 1.2em;">☆</span>';
+    }
+  }
+
+  return `
+    <tr>
+      <td style="padding: 4px 8px; vertical-align: top;">
+        <strong>${i + 1}. ${titulo}</strong><br>
+        ${evalNum !== null ? `<div>${estrellasHTML}</div>` : ''}
+      </td>
+      <td style="padding: 4px 8px; vertical-align: top;">${razon}</td>
+    </tr>
+  `;
+}
+
+
+function recomendacionesTableHTML(rows) {
+  return `
+    <div>
+      <p>🎬 <strong>Recomendaciones:</strong></p>
+      <table style="border-collapse: collapse; width: 100%; margin-top: 6px;">
+        <thead>
+          <tr>
+            <th style="text-align: left; padding: 4px 8px;">Película</th>
+            <th style="text-align: left; padding: 4px 8px;">Motivo</th>
+          </tr>
+        </thead>
+        <tbody>${rows}</tbody>
+      </table>
+    </div>
+  `;
+}
+
+
+// Lee un cuerpo text/event-stream y llama a onEvent(evento, datos) por cada evento.
+async function readEventStream(res, onEvent) {
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let sep;
+    while ((sep = buffer.indexOf('\n\n')) !== -1) {
+      const block = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+
+      let evento = 'message';
+      let data = '';
+      for (const line of block.split('\n')) {
+        if (line.startsWith('event:')) evento = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      }
+      onEvent(evento, data ? JSON.parse(data) : null);
+    }
+  }
+}
+
+
 // NUEVA FUNCIÓN: Envía el mensaje al backend y procesa la respuesta.
+// Usa /gateway/stream para mostrar cada película en cuanto el backend la resuelve.
 async function getBotResponseFromBackend(message) {
   // Mostrar mensaje de carga
   let loadingMessage = appendMessage("...", 'bot');
 
   try {
-    const res = await fetch(`${API_BASE}/gateway`, {
+    const res = await fetch(`${API_BASE}/gateway/stream`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify({ utterance: message, tipo_busqueda: "texto" })
     });
 
-    // Quitar mensaje de carga
-    const chatHistory = document.getElementById('chat-history');
-    if (loadingMessage && chatHistory.contains(loadingMessage)) {
-      chatHistory.removeChild(loadingMessage);
-    }
-
     if (!res.ok) {
+      removeMessage(loadingMessage);
       const errText = await res.text();
-      const httpCode = res.status;
-      if (httpCode != 422) {
-        appendMessage(`❌ Error: ${res.status} ${errText}`, 'bot');
-      } else {
-        appendMessage("❌ Esta operación no está implementada, por favor intenta de nuevo.", 'bot');
-      }
+      appendMessage(`❌ Error: ${res.status} ${errText}`, 'bot');
       return;
     }
 
-    const data = await res.json();
-
-    // 🔹 Caso 1: Respuesta con lista de recomendaciones
-    if (Array.isArray(data.detalles) && data.detalles.length) {
-      const rows = data.detalles.map((d, i) => {
-        const titulo = d.pelicula?.titulo ?? '(sin título)';
-        const razon = d.razon_recomendacion ?? '';
-        const evalNum = typeof d.evaluacion === 'number' ? d.evaluacion : null;
-
-        // Generar estrellas
-        let estrellasHTML = '';
-        if (evalNum !== null) {
-          const maxStars = 5;
-          for (let s = 1; s <= maxStars; s++) {
-            estrellasHTML += s <= evalNum
-              ? '<span style="color: gold; font-size: 1.2em;">★</span>'
-              : '<span style="color: #ccc; font-size: 1.2em;">☆</span>';
-          }
-        }
+    // Tabla que se va llenando con los eventos "detalle"
+    let liveTable = null;
+    let liveRows = '';
+    let liveCount = 0;
 
-        return `
-          <tr>
-            <td style="padding: 4px 8px; vertical-align: top;">
-              <strong>${i + 1}. ${titulo}</strong><br>
-              ${evalNum !== null ? `<div>${estrellasHTML}</div>` : ''}
-            </td>
-            <td style="padding: 4px 8px; vertical-align: top;">${razon}</td>
-          </tr>
-        `;
-      }).join('');
-
-      const tableHTML = `
-        <div>
-          <p>🎬 <strong>Recomendaciones:</strong></p>
-          <table style="border-collapse: collapse; width: 100%; margin-top: 6px;">
-            <thead>
-              <tr>
-                <th style="text-align: left; padding: 4px 8px;">Película</th>
-                <th style="text-align: left; padding: 4px 8px;">Motivo</th>
-              </tr>
-            </thead>
-            <tbody>${rows}</tbody>
-          </table>
-        </div>
-      `;
-      appendMessage(tableHTML, 'bot');
-      return;
-    }
+    await readEventStream(res, (evento, datos) => {
+      if (evento === 'intencion') {
+        loadingMessage.innerHTML = '🔎 Buscando...';
+        return;
+      }
 
-    // 🔹 Caso 2: Sin recomendaciones pendientes (mensaje especial)
-    if (data.mensaje && data.mensaje.includes("No hay recomendaciones pendientes")) {
-      appendMessage("🎉 ¡Has terminado de evaluar todas las recomendaciones! Gracias por tu participación. 🙌", 'bot');
-      return;
-    }
+      if (evento === 'detalle') {
+        removeMessage(loadingMessage);
+        liveRows += detalleRowHTML(datos, liveCount++);
+        if (!liveTable) {
+          liveTable = appendMessage(recomendacionesTableHTML(liveRows), 'bot');
+        } else {
+          liveTable.innerHTML = recomendacionesTableHTML(liveRows);
+        }
+        const chatHistory = document.getElementById('chat-history');
+        chatHistory.scrollTop = chatHistory.scrollHeight;
+        return;
+      }
 
-    // 🔹 Caso 3: Evaluación pendiente (intención calificar_recomendaciones)
-    if (data.mensaje && data.mensaje.includes("Evaluación pendiente") && data.detalle) {
-      const d = data.detalle;
-      const peli = d.pelicula ?? {};
-      const buttons = [0, 1, 2, 3, 4, 5]
-        .map(n => `<button class="rating-btn" data-id="${d.objectId}" data-score="${n}">${n}</button>`)
-        .join('') + `<button class="rating-btn" data-score="exit">Salir</button>`;
-
-      const html = `
-        <div class="rating-block">
-          <p>🎬 <strong>${peli.titulo}</strong></p>
-          <p>${peli.sinopsis ?? '(Sin sinopsis disponible)'}<br>
-          💡 <em>${d.razon_recomendacion ?? ''}</em></p>
-          <p><strong>Evalúa esta recomendación:</strong></p>
-          <div>${buttons}</div>
-        </div>
-      `;
-
-      const msgDiv = appendMessage(html, 'bot');
-
-      // Agregar listeners a los botones
-      msgDiv.querySelectorAll('.rating-btn').forEach(btn => {
-        btn.addEventListener('click', async (ev) => {
-          const score = ev.target.dataset.score;
-          if (score === 'exit') {
-            appendMessage("Gracias por tus evaluaciones 😊", 'bot');
-            return;
-          }
-          const id = ev.target.dataset.id;
-          await fetch(`${API_BASE}/evaluar/${id}?evaluacion=${score}`, { method: "PATCH" });
-          appendMessage(`⭐ Evaluación registrada (${score} estrellas).`, 'bot');
-          // Mostrar siguiente
-          getBotResponseFromBackend("quiero calificar las recomendaciones");
-        });
-      });
-      return;
-    }
+      if (evento === 'error') {
+        removeMessage(loadingMessage);
+        if (datos.status != 422) {
+          appendMessage(`❌ Error: ${datos.status} ${datos.detail}`, 'bot');
+        } else {
+          appendMessage("❌ Esta operación no está implementada, por favor intenta de nuevo.", 'bot');
+        }
+        return;
+      }
 
-    // 🔹 Caso 4: Mensajes simples
-    if (data.mensaje) {
-      appendMessage(`✅ ${data.mensaje}`, 'bot');
-      return;
-    }
+      if (evento === 'resumen') {
+        removeMessage(loadingMessage);
+        // Si las películas ya se mostraron una a una, no repetir la tabla
+        if (!liveTable) {
+          renderGatewayResponse(datos);
+        }
+      }
+    });
 
-    // 🔹 Fallback
-    appendMessage('🤖 No tengo resultados para mostrar.', 'bot');
+    removeMessage(loadingMessage);
 
   } catch (error) {
-    const chatHistory = document.getElementById('chat-history');
-    if (loadingMessage && chatHistory.contains(loadingMessage)) {
-      chatHistory.removeChild(loadingMessage);
-    }
+    removeMessage(loadingMessage);
     appendMessage(`❌ Error de conexión: ${error.message}`, 'bot');
   }
 }
+
+
+// Muestra una respuesta completa de /gateway (evento "resumen").
+function renderGatewayResponse(data) {
+  // 🔹 Caso 1: Respuesta con lista de recomendaciones
+  if (Array.isArray(data.detalles) && data.detalles.length) {
+    const rows = data.detalles.map((d, i) => detalleRowHTML(d, i)).join('');
+    appendMessage(recomendacionesTableHTML(rows), 'bot');
+    return;
+  }
+
+  // 🔹 Caso 2: Sin recomendaciones pendientes (mensaje especial)
+  if (data.mensaje && data.mensaje.includes("No hay recomendaciones pendientes")) {
+    appendMessage("🎉 ¡Has terminado de evaluar todas las recomendaciones! Gracias por tu participación. 🙌", 'bot');
+    return;
+  }
+
+  // 🔹 Caso 3: Evaluación pendiente (intención calificar_recomendaciones)
+  if (data.mensaje && data.mensaje.includes("Evaluación pendiente") && data.detalle) {
+    const d = data.detalle;
+    const peli = d.pelicula ?? {};
+    const buttons = [0, 1, 2, 3, 4, 5]
+      .map(n => `<button class="rating-btn" data-id="${d.objectId}" data-score="${n}">${n}</button>`)
+      .join('') + `<button class="rating-btn" data-score="exit">Salir</button>`;
+
+    const html = `
+      <div class="rating-block">
+        <p>🎬 <strong>${peli.titulo}</strong></p>
+        <p>${peli.sinopsis ?? '(Sin sinopsis disponible)'}<br>
+        💡 <em>${d.razon_recomendacion ?? ''}</em></p>
+        <p><strong>Evalúa esta recomendación:</strong></p>
+        <div>${buttons}</div>
+      </div>
+    `;
+
+    const msgDiv = appendMessage(html, 'bot');
+
+    // Agregar listeners a los botones
+    msgDiv.querySelectorAll('.rating-btn').forEach(btn => {
+      btn.addEventListener('click', async (ev) => {
+        const score = ev.target.dataset.score;
+        if (score === 'exit') {
+          appendMessage("Gracias por tus evaluaciones 😊", 'bot');
+          return;
+        }
+        const id = ev.target.dataset.id;
+        await fetch(`${API_BASE}/evaluar/${id}?evaluacion=${score}`, { method: "PATCH" });
+        appendMessage(`⭐ Evaluación registrada (${score} estrellas).`, 'bot');
+        // Mostrar siguiente
+        getBotResponseFromBackend("quiero calificar las recomendaciones");
+      });
+    });
+    return;
+  }
+
+  // 🔹 Caso 4: Mensajes simples
+  if (data.mensaje) {
+    appendMessage(`✅ ${data.mensaje}`, 'bot');
+    return;
+  }
+
+  // 🔹 Fallback
+  appendMessage('🤖 No tengo resultados para mostrar.', 'bot');
+}